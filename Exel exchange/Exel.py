@@ -1,38 +1,19 @@
 import pandas as pd
-from tkinter import Tk, filedialog
+import argparse
+import hashlib
 import os
+import sys
 
-Tk().withdraw()
+# общий пакет data лежит в корне проекта
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Выбираем первый файл (маленький – 686 строк)
-print("Выбери файл 1 (Ex: POG and Backwall Iyul transactions 1.xlsx):")
-file1 = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
+from data import (DUP_POLICIES, build_key_index, canonical_phone, file_sha256, gather_left,
+                  read_excel, reduce_duplicates, write_xlsx)
 
-# Выбираем второй файл (большой – 7000+ строк)
-print("Выбери файл 2 (Ex: POG and Backwall Iyul transactions 2.xlsx):")
-file2 = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
+KEY = "Phone"
 
-# Читаем Excel файлы
-df1 = pd.read_excel(file1)
-df2 = pd.read_excel(file2)
-
-# Убираем пробелы в названиях колонок
-df1.columns = df1.columns.str.strip()
-df2.columns = df2.columns.str.strip()
-
-print("Файл 1:", df1.columns.tolist())
-print("Файл 2:", df2.columns.tolist())
-
-# Объединяем по колонке "Phone"
-merged = pd.merge(
-    df1,
-    df2,
-    on="Phone",
-    how="left"   # оставляем все строки из df1 (686 строк)
-)
-
-# Оставляем только нужные колонки
-final = merged[[
+# Колонки, которые остаются в результате (берутся из файла 1 или файла 2)
+KEEP_COLUMNS = [
     "Phone",
     "Описание",
     "Сумма (UZS)",
@@ -41,13 +22,199 @@ final = merged[[
     "Название",
     "Город",
     "Дата регистрации"
-]]
+]
+
+OUTPUT_DIR = "output"
+INDEX_DIR = os.path.join(OUTPUT_DIR, ".index")
+
+
+def read_columns(path: str, columns=None) -> pd.DataFrame:
+    """Читает из Excel только нужные колонки (имена сравниваются без пробелов по краям); None — все."""
+    # без sidecar-кэша: узкий кадр и индекс кэшируются в output/.index
+    return read_excel(path, columns=columns, use_cache=False, strip=True)
+
+
+def load_reference_index(path: str, columns, key: str = KEY):
+    """Узкий кадр большого файла + индекс телефон -> позиции строк.
+
+    Хранится в output/.index и считается актуальным, пока совпадают SHA-256 файла
+    и список колонок; иначе файл перечитывается и индекс строится заново.
+    """
+    if columns is not None:
+        columns = [key] + [c for c in columns if c != key]
+    digest = file_sha256(path)
+    name = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    cache_path = os.path.join(INDEX_DIR, f"{name}.pkl")
+
+    if os.path.exists(cache_path):
+        try:
+            cached = pd.read_pickle(cache_path)
+            if cached["sha256"] == digest and cached["columns"] == columns:
+                return cached["frame"], cached["index"]
+        except Exception:
+            pass
+
+    ref = read_columns(path, columns).reset_index(drop=True)
+    if key not in ref.columns:
+        raise KeyError(f"В файле {path} нет колонки '{key}'")
+    index = build_key_index(canonical_phone(ref[key]))
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    # через временный файл: lookup может строить индексы параллельно
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    pd.to_pickle({"sha256": digest, "columns": columns, "frame": ref, "index": index}, tmp_path)
+    os.replace(tmp_path, cache_path)
+    return ref, index
+
+
+def reduce_reference(path: str, policy: str = "first", columns=None, key: str = KEY):
+    """Сводит справочник к одной строке на телефон, чтобы left join не размножал строки.
+
+    Политики — см. data.reduce_duplicates. Возвращает (кадр с индексом по
+    каноническому телефону, число строк на телефон). Выполняется в отдельном
+    процессе для каждого справочника.
+    """
+    if policy not in DUP_POLICIES:
+        raise ValueError(f"Неизвестная политика дубликатов: {policy}")
+    ref, _ = load_reference_index(path, columns, key)
+    return reduce_duplicates(ref.drop(columns=[key]), canonical_phone(ref[key]), policy)
+
+
+def lookup(base: pd.DataFrame, references, policies, columns=None, key: str = KEY, workers=None):
+    """Дополняет base из нескольких справочников; число строк base не меняется.
+
+    Справочники сводятся параллельно (по процессу на файл). Возвращает (результат,
+    список статистик кардинальности по каждому справочнику).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    base_keys = canonical_phone(base[key])
+    result = base.copy()
+    stats = []
+    with ProcessPoolExecutor(max_workers=workers or min(len(references), os.cpu_count() or 1)) as pool:
+        futures = [pool.submit(reduce_reference, ref, pol, columns, key) for ref, pol in zip(references, policies)]
+        for ref_path, policy, fut in zip(references, policies, futures):
+            reduced, counts = fut.result()
+            label = os.path.splitext(os.path.basename(ref_path))[0]
+            multiplicity = base_keys.map(counts)
+            stats.append({
+                "reference": ref_path,
+                "policy": policy,
+                "ref_rows": int(counts.sum()),
+                "ref_unique_phones": int(len(counts)),
+                "ref_duplicated_phones": int((counts > 1).sum()),
+                "ref_max_rows_per_phone": int(counts.max()) if len(counts) else 0,
+                "base_rows": int(len(base)),
+                "base_matched": int(multiplicity.notna().sum()),
+                "base_unmatched": int(multiplicity.isna().sum()),
+                # сколько строк дал бы обычный pd.merge(how="left")
+                "naive_left_join_rows": int(multiplicity.fillna(1).sum()),
+            })
+            if policy == "count":
+                reduced = reduced.rename(columns={"count": "Количество"})
+            renamed = {c: (f"{label}__{c}" if c in result.columns else c) for c in reduced.columns}
+            part = reduced.rename(columns=renamed).reindex(base_keys.to_numpy())
+            if policy == "count":
+                part = part.fillna(0).astype(int)
+            result = pd.concat([result, part.set_axis(result.index)], axis=1)
+    return result, stats
+
+
+def enrich(base: pd.DataFrame, ref_path: str, keep_columns=KEEP_COLUMNS, key: str = KEY) -> pd.DataFrame:
+    """Левое объединение маленького файла с большим по телефону через индекс.
+
+    Из большого файла берутся только колонки из keep_columns, которых нет в base;
+    строки большого файла, не совпавшие ни с одним телефоном, не трогаются.
+
+    Телефоны сравниваются в каноническом виде (data.canonical_phone — только цифры),
+    а не как сырые значения в прежнем pd.merge(on="Phone", how="left"):
+    - '+998 90 123-45-67', '998901234567' и 998901234567.0 теперь совпадают;
+    - пустой телефон ни с чем не совпадает (колонки справочника остаются пустыми),
+      тогда как pd.merge сопоставлял его с каждой строкой справочника с пустым
+      телефоном и размножал строку базы;
+    - повтор телефона в справочнике по-прежнему даёт несколько строк, как в pd.merge.
+    """
+    ref_columns = [c for c in keep_columns if c not in base.columns or c == key]
+    ref, index = load_reference_index(ref_path, ref_columns, key)
+    merged = gather_left(base, canonical_phone(base[key]), ref.drop(columns=[key]), index)
+    return merged[[c for c in keep_columns if c in merged.columns]]
+
+
+def pick_files():
+    from tkinter import Tk, filedialog
+
+    Tk().withdraw()
+
+    # Выбираем первый файл (маленький – 686 строк)
+    print("Выбери файл 1 (Ex: POG and Backwall Iyul transactions 1.xlsx):")
+    file1 = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
+
+    # Выбираем второй файл (большой – 7000+ строк)
+    print("Выбери файл 2 (Ex: POG and Backwall Iyul transactions 2.xlsx):")
+    file2 = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
+    return file1, file2
+
+
+def lookup_main(argv):
+    parser = argparse.ArgumentParser(prog="Exel.py lookup",
+                                     description="Поиск по телефону в нескольких справочниках без размножения строк")
+    parser.add_argument("--base", required=True, help="Базовый файл; число его строк сохраняется")
+    parser.add_argument("--ref", action="append", required=True, help="Файл-справочник (можно несколько раз)")
+    parser.add_argument("--policy", choices=DUP_POLICIES, default="first",
+                        help="Что делать с повторами телефона в справочнике")
+    parser.add_argument("--policy-for", action="append", default=[], metavar="FILE=POLICY",
+                        help="Своя политика для отдельного справочника")
+    parser.add_argument("--columns", nargs="+", help="Брать из справочников только эти колонки")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=os.path.join(OUTPUT_DIR, "lookup.xlsx"))
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.policy_for:
+        path, _, pol = item.rpartition("=")
+        if pol not in DUP_POLICIES:
+            parser.error(f"--policy-for {item}: политика должна быть одной из {', '.join(DUP_POLICIES)}")
+        overrides[os.path.abspath(path)] = pol
+    policies = [overrides.get(os.path.abspath(r), args.policy) for r in args.ref]
+
+    base = read_excel(args.base, use_cache=False, strip=True)
+    result, stats = lookup(base, args.ref, policies, args.columns, workers=args.workers)
+
+    print(pd.DataFrame(stats).set_index("reference").T.to_string())
+    write_xlsx(result, args.output)
+    print(f"✅ Готово! {len(result)} строк (в базе {len(base)}), файл: {args.output}")
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "lookup":
+        return lookup_main(argv[1:])
+
+    parser = argparse.ArgumentParser(description="Дополнение файла 1 данными из файла 2 по колонке Phone")
+    parser.add_argument("--base", help="Файл 1 (маленький); без аргументов — выбор в диалоге")
+    parser.add_argument("--reference", help="Файл 2 (большой, справочник)")
+    parser.add_argument("--output", default=os.path.join(OUTPUT_DIR, "result.xlsx"))
+    args = parser.parse_args(argv)
+
+    file1, file2 = (args.base, args.reference) if args.base and args.reference else pick_files()
+    if not file1 or not file2:
+        print("❌ Файлы не выбраны")
+        return 1
+
+    # Маленький файл читаем целиком (однократно, без кэша), большой — только нужные колонки (через кэш индекса)
+    df1 = read_excel(file1, use_cache=False, strip=True)
+    print("Файл 1:", df1.columns.tolist())
+
+    final = enrich(df1, file2)
+    print("Файл 2 (нужные колонки):", [c for c in final.columns if c not in df1.columns or c == KEY])
+
+    # Сохраняем результат (папка "output" создаётся, если её нет)
+    write_xlsx(final, args.output)
 
-# Создаём папку "output" в проекте (если её нет)
-os.makedirs("output", exist_ok=True)
+    print("✅ Готово! Файл сохранён в:", args.output)
+    return 0
 
-# Сохраняем результат
-result_file = os.path.join("output", "result.xlsx")
-final.to_excel(result_file, index=False)
 
-print("✅ Готово! Файл сохранён в:", result_file)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,17 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from functools import reduce
+from itertools import repeat
 from io import BytesIO
 import re
 from datetime import datetime
 import os
+import sys
 from pathlib import Path
 import sqlite3
 import json
+import hashlib
+from datetime import date
 
 # Попытка импортировать AgGrid; graceful fallback к st.dataframe если недоступен
 try:
@@ -24,8 +27,27 @@ try:
 except NameError:
     BASE_DIR = Path.cwd()
 
+# общий пакет data лежит в корне проекта
+sys.path.insert(0, str(BASE_DIR.parent))
+from data import (MB, XLSX_MIME, FrameCache, IngestGate, budget_from_env, content_hash, diff_frames,
+                  diff_to_parquet_bytes, diff_to_xlsx_bytes, downcast_frame, estimate_workbook_bytes,
+                  frame_bytes, merge_on_id, merge_on_id_partitioned, prune_cache, read_excel,
+                  read_excel_bytes, to_str_id, to_xlsx_bytes, write_styled_xlsx, write_xlsx)
+
 DB_PATH = BASE_DIR / "merged_history.db"
+CACHE_DIR = Path(os.getenv("KTNG_CACHE_DIR", BASE_DIR / ".ktng_cache"))
+UPLOAD_CACHE_TTL_H = float(os.getenv("KTNG_UPLOAD_CACHE_TTL_H", 24))
 MERGED_DIR = BASE_DIR / "merged_files"
+# лимиты памяти: на одну сессию (сумма загруженных файлов) и на сервер (одновременный разбор);
+# общие для всех сессий кэши ограничены отдельно, по байтам
+SESSION_MEMORY_BUDGET = budget_from_env("KTNG_SESSION_MEMORY_MB", 1024)
+SERVER_INGEST_BUDGET = budget_from_env("KTNG_SERVER_INGEST_MB", 2048)
+FRAME_CACHE_BUDGET = budget_from_env("KTNG_FRAME_CACHE_MB", 512)
+PREPARED_CACHE_BUDGET = budget_from_env("KTNG_PREPARED_CACHE_MB", 256)
+DIFF_CACHE_BUDGET = budget_from_env("KTNG_DIFF_CACHE_MB", 128)
+INGEST_WAIT_S = float(os.getenv("KTNG_INGEST_WAIT_S", 60))
+# параллельное объединение по хэш-корзинам ID; только по флажку — выигрыш на нескольких ядрах пока не измерен
+MERGE_WORKERS = int(os.getenv("KTNG_MERGE_WORKERS", os.cpu_count() or 1))
 MERGED_DIR.mkdir(parents=True, exist_ok=True)
 
 # ---------------------- Переводы ----------------------
@@ -69,7 +91,36 @@ translations = {
         "dark": "🌙 Dark",
         "clear_history": "🗑️ Clear merged history",
         "save_merged": "💾 Save merged to server (add to history)",
-        "auto_save": "🔁 Auto-save merged to server"
+        "auto_save": "🔁 Auto-save merged to server",
+        "recipes": "📋 Merge recipes",
+        "recipe_apply": "Apply recipe",
+        "recipe_save_as": "💾 Save these settings as recipe (name, optional)",
+        "recipe_saved": "Recipe «{name}» saved.",
+        "recipe_cache": "Reused {hits} of {total} prepared files from cache.",
+        "error_budget": "Files need about {need:,.0f} MB in memory, the limit is {limit:,.0f} MB. Upload fewer or smaller files.",
+        "info_queue": "Waiting for memory to parse {name}…",
+        "error_queue": "Server is busy, {name} was not parsed. Try again later.",
+        "error_queue_merge": "Server is busy, the merge was not started. Try again later.",
+        "info_memory": "In memory: {used:,.1f} MB (estimated {est:,.1f} MB, limit {limit:,.0f} MB)",
+        "compare": "🆚 Compare two merges",
+        "compare_old": "Old",
+        "compare_new": "New",
+        "compare_run": "Compare",
+        "compare_close": "Close comparison",
+        "compare_export": "📦 Prepare downloads",
+        "compare_title": "🆚 {old} → {new}",
+        "error_compare": "Could not compare: {error}",
+        "diff_added": "Added",
+        "diff_removed": "Removed",
+        "diff_changed": "Changed",
+        "diff_unchanged": "Unchanged",
+        "id_search": "🔎 Find ID in history",
+        "id_search_input": "ID / phone",
+        "id_search_row": "row {row}",
+        "id_search_none": "Not found in saved merges.",
+        "id_search_pending": "{count} older merges are not indexed yet.",
+        "id_search_index": "Index them",
+        "parallel_merge": "⚡ Parallel merge ({workers} processes)"
     },
     "ru": {
         "title": "📊 Объединение нескольких Excel по ID",
@@ -110,7 +161,36 @@ translations = {
         "dark": "🌙 Тёмная",
         "clear_history": "🗑️ Очистить историю объединений",
         "save_merged": "💾 Сохранить объединённый на сервер (добавить в историю)",
-        "auto_save": "🔁 Автосохранить объединённый на сервер"
+        "auto_save": "🔁 Автосохранить объединённый на сервер",
+        "recipes": "📋 Рецепты объединения",
+        "recipe_apply": "Применить рецепт",
+        "recipe_save_as": "💾 Сохранить настройки как рецепт (имя, необязательно)",
+        "recipe_saved": "Рецепт «{name}» сохранён.",
+        "recipe_cache": "Из кэша взято {hits} из {total} подготовленных файлов.",
+        "error_budget": "Файлам нужно около {need:,.0f} МБ памяти, лимит {limit:,.0f} МБ. Загрузите меньше файлов или файлы поменьше.",
+        "info_queue": "Ожидание памяти для разбора {name}…",
+        "error_queue": "Сервер занят, {name} не разобран. Повторите позже.",
+        "error_queue_merge": "Сервер занят, объединение не запущено. Повторите позже.",
+        "info_memory": "В памяти: {used:,.1f} МБ (оценка {est:,.1f} МБ, лимит {limit:,.0f} МБ)",
+        "compare": "🆚 Сравнить два объединения",
+        "compare_old": "Было",
+        "compare_new": "Стало",
+        "compare_run": "Сравнить",
+        "compare_close": "Закрыть сравнение",
+        "compare_export": "📦 Подготовить файлы для скачивания",
+        "compare_title": "🆚 {old} → {new}",
+        "error_compare": "Не удалось сравнить: {error}",
+        "diff_added": "Добавлено",
+        "diff_removed": "Удалено",
+        "diff_changed": "Изменено",
+        "diff_unchanged": "Без изменений",
+        "id_search": "🔎 Поиск ID по истории",
+        "id_search_input": "ID / телефон",
+        "id_search_row": "строка {row}",
+        "id_search_none": "В сохранённых объединениях не найден.",
+        "id_search_pending": "Старых объединений без индекса: {count}.",
+        "id_search_index": "Проиндексировать",
+        "parallel_merge": "⚡ Параллельное объединение ({workers} процессов)"
     },
     "uz": {
         "title": "📊 Bir nechta Excel fayllarini ID bo‘yicha birlashtirish",
@@ -151,7 +231,36 @@ translations = {
         "dark": "🌙 Qorong‘i",
         "clear_history": "🗑️ Tarixni o‘chirish",
         "save_merged": "💾 Birlashtirilganni serverga saqlash (tarixga qo'shish)",
-        "auto_save": "🔁 Avto-saqlash"
+        "auto_save": "🔁 Avto-saqlash",
+        "recipes": "📋 Birlashtirish retseptlari",
+        "recipe_apply": "Retseptni qo‘llash",
+        "recipe_save_as": "💾 Sozlamalarni retsept sifatida saqlash (nomi, ixtiyoriy)",
+        "recipe_saved": "«{name}» retsepti saqlandi.",
+        "recipe_cache": "{total} ta fayldan {hits} tasi keshdan olindi.",
+        "error_budget": "Fayllarga taxminan {need:,.0f} MB xotira kerak, chegara {limit:,.0f} MB. Kamroq yoki kichikroq fayl yuklang.",
+        "info_queue": "{name} faylini o‘qish uchun xotira kutilmoqda…",
+        "error_queue": "Server band, {name} o‘qilmadi. Keyinroq urinib ko‘ring.",
+        "error_queue_merge": "Server band, birlashtirish boshlanmadi. Keyinroq urinib ko‘ring.",
+        "info_memory": "Xotirada: {used:,.1f} MB (taxmin {est:,.1f} MB, chegara {limit:,.0f} MB)",
+        "compare": "🆚 Ikki birlashmani solishtirish",
+        "compare_old": "Oldingi",
+        "compare_new": "Yangi",
+        "compare_run": "Solishtirish",
+        "compare_close": "Solishtirishni yopish",
+        "compare_export": "📦 Yuklab olish fayllarini tayyorlash",
+        "compare_title": "🆚 {old} → {new}",
+        "error_compare": "Solishtirib bo‘lmadi: {error}",
+        "diff_added": "Qo‘shilgan",
+        "diff_removed": "O‘chirilgan",
+        "diff_changed": "O‘zgargan",
+        "diff_unchanged": "O‘zgarmagan",
+        "id_search": "🔎 Tarixdan ID qidirish",
+        "id_search_input": "ID / telefon",
+        "id_search_row": "{row}-qator",
+        "id_search_none": "Saqlangan birlashmalarda topilmadi.",
+        "id_search_pending": "Indekslanmagan eski birlashmalar: {count}.",
+        "id_search_index": "Indekslash",
+        "parallel_merge": "⚡ Parallel birlashtirish ({workers} jarayon)"
     },
     "ko": {
         "title": "📊 여러 Excel 파일을 ID로 병합",
@@ -192,7 +301,36 @@ translations = {
         "dark": "🌙 다크",
         "clear_history": "🗑️ 병합 기록 삭제",
         "save_merged": "💾 병합 파일을 서버에 저장 (기록 추가)",
-        "auto_save": "🔁 자동 저장"
+        "auto_save": "🔁 자동 저장",
+        "recipes": "📋 병합 레시피",
+        "recipe_apply": "레시피 적용",
+        "recipe_save_as": "💾 현재 설정을 레시피로 저장 (이름, 선택)",
+        "recipe_saved": "레시피 «{name}» 저장됨.",
+        "recipe_cache": "{total}개 중 {hits}개 파일을 캐시에서 재사용.",
+        "error_budget": "파일에 약 {need:,.0f} MB 메모리가 필요하며 한도는 {limit:,.0f} MB입니다. 파일 수나 크기를 줄이세요.",
+        "info_queue": "{name} 파싱을 위한 메모리 대기 중…",
+        "error_queue": "서버가 바쁩니다. {name} 파일을 읽지 못했습니다. 나중에 다시 시도하세요.",
+        "error_queue_merge": "서버가 바쁩니다. 병합을 시작하지 못했습니다. 나중에 다시 시도하세요.",
+        "info_memory": "메모리 사용: {used:,.1f} MB (추정 {est:,.1f} MB, 한도 {limit:,.0f} MB)",
+        "compare": "🆚 두 병합 결과 비교",
+        "compare_old": "이전",
+        "compare_new": "최신",
+        "compare_run": "비교",
+        "compare_close": "비교 닫기",
+        "compare_export": "📦 다운로드 파일 준비",
+        "compare_title": "🆚 {old} → {new}",
+        "error_compare": "비교 실패: {error}",
+        "diff_added": "추가",
+        "diff_removed": "삭제",
+        "diff_changed": "변경",
+        "diff_unchanged": "변경 없음",
+        "id_search": "🔎 기록에서 ID 찾기",
+        "id_search_input": "ID / 전화번호",
+        "id_search_row": "{row}행",
+        "id_search_none": "저장된 병합 결과에 없습니다.",
+        "id_search_pending": "색인되지 않은 이전 병합: {count}개.",
+        "id_search_index": "색인 생성",
+        "parallel_merge": "⚡ 병렬 병합 ({workers}개 프로세스)"
     }
 }
 
@@ -212,21 +350,87 @@ def init_db():
             created_at TEXT
         )
     """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS merge_recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            config TEXT NOT NULL,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    """)
+    # индекс ID по всей истории: где встречается ID (запись + номер строки в чистом файле)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS merged_ids (
+            record_id INTEGER NOT NULL,
+            id TEXT NOT NULL,
+            row_offset INTEGER NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_merged_ids_id ON merged_ids(id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_merged_ids_record ON merged_ids(record_id)")
     conn.commit()
     conn.close()
 
-def add_record_db(basename: str, clean_path: str, colored_path: str, rows: int, cols: int):
+def _insert_ids(cur, record_id: int, ids: pd.Series):
+    # row_offset — номер строки данных в чистом файле с нуля (в Excel это строка row_offset + 2)
+    canon = to_str_id(ids.reset_index(drop=True))
+    cur.executemany("INSERT INTO merged_ids (record_id, id, row_offset) VALUES (?, ?, ?)",
+                    zip(repeat(int(record_id)), canon.tolist(), range(len(canon))))
+
+def add_record_db(basename: str, clean_path: str, colored_path: str, rows: int, cols: int, ids: pd.Series = None):
+    """Добавляет запись истории; если переданы ids — в той же транзакции заполняет индекс merged_ids."""
     conn = sqlite3.connect(str(DB_PATH))
     cur = conn.cursor()
     cur.execute("""
         INSERT INTO merged_files (basename, clean_path, colored_path, rows, cols, created_at)
         VALUES (?, ?, ?, ?, ?, ?)
     """, (basename, clean_path, colored_path, int(rows), int(cols), datetime.now().strftime("%Y-%m-%d %H:%M")))
-    conn.commit()
     last_id = cur.lastrowid
+    if ids is not None:
+        _insert_ids(cur, last_id, ids)
+    conn.commit()
     conn.close()
     return last_id
 
+def index_record_ids_db(record_id: int, ids: pd.Series):
+    """(Пере)строит индекс ID для одной записи истории."""
+    conn = sqlite3.connect(str(DB_PATH))
+    cur = conn.cursor()
+    cur.execute("DELETE FROM merged_ids WHERE record_id=?", (record_id,))
+    _insert_ids(cur, record_id, ids)
+    conn.commit()
+    conn.close()
+
+def unindexed_records_db():
+    """Записи, сохранённые до появления индекса (или без строк)."""
+    conn = sqlite3.connect(str(DB_PATH))
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, clean_path FROM merged_files
+        WHERE NOT EXISTS (SELECT 1 FROM merged_ids WHERE merged_ids.record_id = merged_files.id)
+    """)
+    rows = cur.fetchall()
+    conn.close()
+    return [{"id": int(r[0]), "clean_path": r[1]} for r in rows]
+
+def find_id_db(value, limit: int = 200):
+    """В каких сохранённых объединениях встречается ID (значение приводится как ключ объединения)."""
+    key = to_str_id(pd.Series([value])).iloc[0]
+    conn = sqlite3.connect(str(DB_PATH))
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT f.id, f.basename, f.clean_path, f.created_at, i.row_offset
+        FROM merged_ids i JOIN merged_files f ON f.id = i.record_id
+        WHERE i.id = ?
+        ORDER BY f.id DESC, i.row_offset
+        LIMIT ?
+    """, (key, int(limit)))
+    rows = cur.fetchall()
+    conn.close()
+    return [{"record_id": int(r[0]), "basename": r[1], "clean_path": r[2], "created_at": r[3], "row_offset": int(r[4])}
+            for r in rows]
+
 def get_all_records_db():
     conn = sqlite3.connect(str(DB_PATH))
     cur = conn.cursor()
@@ -256,8 +460,9 @@ def delete_record_db(record_id: int, delete_files: bool = True):
         clean_p, colored_p = row[0], row[1]
     else:
         clean_p, colored_p = None, None
-    # удаляем запись
+    # удаляем запись и её ID из индекса
     cur.execute("DELETE FROM merged_files WHERE id=?", (record_id,))
+    cur.execute("DELETE FROM merged_ids WHERE record_id=?", (record_id,))
     conn.commit()
     conn.close()
     # удаляем файлы если нужно
@@ -283,11 +488,63 @@ def clear_history_db(delete_files: bool = False):
     conn = sqlite3.connect(str(DB_PATH))
     cur = conn.cursor()
     cur.execute("DELETE FROM merged_files")
+    cur.execute("DELETE FROM merged_ids")
+    conn.commit()
+    conn.close()
+
+def _json_default(o):
+    """Сериализация дат и numpy-скаляров, которые приходят из виджетов фильтров."""
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def save_recipe_db(name: str, config: dict):
+    """Сохраняет именованный рецепт; рецепт с тем же именем перезаписывается."""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    conn = sqlite3.connect(str(DB_PATH))
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO merge_recipes (name, config, created_at, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET config=excluded.config, updated_at=excluded.updated_at
+    """, (name, json.dumps(config, ensure_ascii=False, default=_json_default), now, now))
+    conn.commit()
+    conn.close()
+
+def get_all_recipes_db():
+    conn = sqlite3.connect(str(DB_PATH))
+    cur = conn.cursor()
+    cur.execute("SELECT id, name, config, created_at, updated_at FROM merge_recipes ORDER BY name")
+    rows = cur.fetchall()
+    conn.close()
+    recipes = []
+    for r in rows:
+        try:
+            config = json.loads(r[2])
+        except ValueError:
+            continue
+        recipes.append({
+            "id": int(r[0]),
+            "name": r[1],
+            "config": config,
+            "created_at": r[3],
+            "updated_at": r[4]
+        })
+    return recipes
+
+def delete_recipe_db(recipe_id: int):
+    conn = sqlite3.connect(str(DB_PATH))
+    cur = conn.cursor()
+    cur.execute("DELETE FROM merge_recipes WHERE id=?", (recipe_id,))
     conn.commit()
     conn.close()
 
 # Инициализируем БД
 init_db()
+# в Parquet-кэше лежат копии загруженных пользователями данных — держим их недолго
+prune_cache(CACHE_DIR, max_age_s=UPLOAD_CACHE_TTL_H * 3600)
 
 # ---------------------- Helpers (columns/types/filters/etc) ----------------------
 def normalize_colname(s: str) -> str:
@@ -324,9 +581,6 @@ def guess_id_column(df: pd.DataFrame) -> str:
     best = max(scores, key=scores.get)
     return best
 
-def to_str_id(series: pd.Series) -> pd.Series:
-    return series.astype(str).str.strip()
-
 def style_unmatched(df: pd.DataFrame):
     def row_style(row):
         return ['background-color: #ffe5e5'] * len(row) if row.get('__unmatched', False) else [''] * len(row)
@@ -377,6 +631,130 @@ def apply_filters(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
                 res = res[res[col].astype(str).str.contains(substr, case=False, na=False)]
     return res
 
+# ---------- Recipe steps and memoized preparation ----------
+
+def step_hash(step: dict) -> str:
+    # ключи фильтров — имена колонок, могут быть не строками (например, годы)
+    norm = {**step, "filters": {str(k): v for k, v in (step.get("filters") or {}).items()}}
+    payload = json.dumps(norm, sort_keys=True, ensure_ascii=False, default=_json_default)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def build_prepare_step(name: str, id_col: str, include_cols: list, filters: dict,
+                       add_prefix: bool, fill_value) -> dict:
+    """Всё, что влияет на подготовленный кадр одного файла (ключ мемоизации вместе с хэшем файла)."""
+    return {
+        "id_col": id_col,
+        "include_cols": list(include_cols),
+        "filters": filters or {},
+        "add_prefix": bool(add_prefix),
+        # имя файла влияет на результат только через префикс колонок
+        "prefix_name": name if add_prefix else None,
+        "fill_value": fill_value,
+    }
+
+def prepare_frame(df: pd.DataFrame, step: dict):
+    """Колонки -> фильтры -> дедупликация по ID -> колонка 'id' -> префикс -> fillna.
+
+    Возвращает (подготовленный кадр, число отброшенных дубликатов ID).
+    """
+    idc = step["id_col"]
+    cols_to_keep = [c for c in step["include_cols"] if c in df.columns]
+    work_filtered = apply_filters(df[cols_to_keep], step["filters"])
+    if idc not in work_filtered.columns:
+        raise KeyError(idc)
+
+    dup_count = int(work_filtered[idc].duplicated(keep="first").sum())
+    if dup_count:
+        work_filtered = work_filtered.drop_duplicates(subset=[idc], keep="first")
+    work_filtered = work_filtered.copy()
+
+    work_filtered["id"] = to_str_id(work_filtered[idc])
+
+    if step["add_prefix"]:
+        other_cols = [c for c in work_filtered.columns if c not in [idc, "id"]]
+        work_filtered = work_filtered.rename(columns={c: f"{step['prefix_name']}__{c}" for c in other_cols})
+
+    if idc != "id":
+        work_filtered = work_filtered.drop(columns=[idc], errors="ignore")
+
+    # в category-колонки (после downcast_frame) можно вписать только известное значение
+    for c in work_filtered.select_dtypes("category").columns:
+        if step["fill_value"] not in work_filtered[c].cat.categories:
+            work_filtered[c] = work_filtered[c].cat.add_categories([step["fill_value"]])
+    work_filtered = work_filtered.fillna(step["fill_value"])
+    return work_filtered, dup_count
+
+@st.cache_resource
+def get_prepared_cache() -> FrameCache:
+    """Общий для сессий LRU: (хэш файла, хэш шага) -> (кадр, дубликаты), не больше PREPARED_CACHE_BUDGET байт."""
+    return FrameCache(PREPARED_CACHE_BUDGET, sizeof=lambda item: frame_bytes(item[0]))
+
+def prepare_frame_memoized(file_hash: str, df: pd.DataFrame, step: dict):
+    """Как prepare_frame, но повторно не пересчитывает неизменённые файлы.
+
+    Возвращает (кадр, дубликаты, взят_из_кэша). Кадр из кэша общий — не изменяйте его на месте.
+    """
+    cache = get_prepared_cache()
+    key = (file_hash, step_hash(step))
+    hit = cache.get(key)
+    if hit is not None:
+        frame, dup_count = hit
+        return frame, dup_count, True
+    # сама подготовка — вне блокировки кэша, чтобы сессии не ждали друг друга
+    frame, dup_count = prepare_frame(df, step)
+    cache.put(key, (frame, dup_count))
+    return frame, dup_count, False
+
+@st.cache_resource
+def get_frame_cache() -> FrameCache:
+    """Общий для сессий LRU прочитанных (и ужатых) загрузок: хэш файла -> кадр, не больше FRAME_CACHE_BUDGET байт."""
+    return FrameCache(FRAME_CACHE_BUDGET)
+
+def read_excel_cached(file_hash: str, data: bytes) -> pd.DataFrame:
+    # между перезапусками сервера кадр берётся из Parquet-кэша пакета data;
+    # в кэше держим уже ужатый кадр
+    cache = get_frame_cache()
+    df = cache.get(file_hash)
+    if df is None:
+        df = downcast_frame(read_excel_bytes(data, content_id=file_hash, cache_dir=CACHE_DIR))
+        cache.put(file_hash, df)
+    return df
+
+@st.cache_resource
+def get_ingest_gate() -> IngestGate:
+    """Один на процесс сервера: сколько байт сейчас разбирается всеми сессиями."""
+    return IngestGate(SERVER_INGEST_BUDGET)
+
+@st.cache_resource
+def get_diff_cache() -> FrameCache:
+    # сравнения и собранные из них выгрузки (bytes) — в одном лимите
+    return FrameCache(DIFF_CACHE_BUDGET,
+                      sizeof=lambda v: len(v) if isinstance(v, bytes)
+                      else sum(frame_bytes(v[k]) for k in ("added", "removed", "changed")))
+
+def diff_records_cached(old_path: str, new_path: str, old_mtime: float, new_mtime: float) -> dict:
+    # mtime в ключе: перезаписанный файл сравнивается заново; сами книги читаются через Parquet-кэш
+    cache = get_diff_cache()
+    key = (old_path, new_path, old_mtime, new_mtime)
+    diff = cache.get(key)
+    if diff is None:
+        old = read_excel(old_path, cache_dir=CACHE_DIR)
+        new = read_excel(new_path, cache_dir=CACHE_DIR)
+        diff = diff_frames(old, new, key="id")
+        cache.put(key, diff)
+    return diff
+
+def diff_export_cached(fmt: str, old_path: str, new_path: str, old_mtime: float, new_mtime: float) -> bytes:
+    # xlsx большого сравнения собирается секунды: только по кнопке и один раз, а не на каждом перезапуске скрипта
+    cache = get_diff_cache()
+    key = (old_path, new_path, old_mtime, new_mtime, fmt)
+    data = cache.get(key)
+    if data is None:
+        diff = diff_records_cached(old_path, new_path, old_mtime, new_mtime)
+        data = (diff_to_xlsx_bytes if fmt == "xlsx" else diff_to_parquet_bytes)(diff).getvalue()
+        cache.put(key, data)
+    return data
+
 # ---------- Utilities for saving files ----------
 def unique_path_for(path: Path, allow_overwrite: bool = False) -> Path:
     if allow_overwrite or not path.exists():
@@ -401,21 +779,15 @@ def save_merged_files_to_disk(basename: str, clean_df: pd.DataFrame, styled_obj,
 
     # save clean
     try:
-        clean_df.to_excel(clean_path, index=False, engine="openpyxl")
+        write_xlsx(clean_df, clean_path)
     except Exception as e:
         raise RuntimeError(f"Could not save clean Excel: {e}")
 
     # try styled -> colored, fallback to merged_df
     try:
-        if styled_obj is not None:
-            styled_obj.to_excel(colored_path, engine="openpyxl", index=False)
-        else:
-            merged_df.to_excel(colored_path, index=False, engine="openpyxl")
-    except Exception:
-        try:
-            merged_df.to_excel(colored_path, index=False, engine="openpyxl")
-        except Exception as e:
-            raise RuntimeError(f"Could not save colored Excel: {e}")
+        write_styled_xlsx(styled_obj, merged_df, colored_path)
+    except Exception as e:
+        raise RuntimeError(f"Could not save colored Excel: {e}")
 
     return {
         "basename": base,
@@ -482,7 +854,7 @@ with st.sidebar.expander(t["history"], expanded=True):
                     with cp.open("rb") as fh:
                         b = fh.read()
                     st.download_button(f"⬇️ {cp.name}", data=b, file_name=cp.name,
-                                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                       mime=XLSX_MIME,
                                        key=f"hist_dl_clean_{rec['id']}")
                 except Exception as e:
                     st.warning(f"Could not prepare download for {cp.name}: {e}")
@@ -493,7 +865,7 @@ with st.sidebar.expander(t["history"], expanded=True):
                     with Path(colp).open("rb") as fh:
                         b2 = fh.read()
                     st.download_button(f"⬇️ {Path(colp).name}", data=b2, file_name=Path(colp).name,
-                                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                       mime=XLSX_MIME,
                                        key=f"hist_dl_col_{rec['id']}")
                 except Exception as e:
                     st.warning(f"Could not prepare download for {colp.name}: {e}")
@@ -511,23 +883,165 @@ with st.sidebar.expander(t["history"], expanded=True):
         st.success("History cleared.")
         st.experimental_rerun()
 
+# Sidebar: compare two saved merges (row-level diff by id)
+recs_by_id = {r["id"]: r for r in recs}
+if len(recs_by_id) >= 2:
+    with st.sidebar.expander(t.get("compare", "🆚 Compare two merges"), expanded=False):
+        def rec_label(rid): return f"{recs_by_id[rid]['basename']} ({recs_by_id[rid]['created_at']})"
+        rec_ids = list(recs_by_id)
+        # история отсортирована от новых к старым: по умолчанию «было» — предыдущий, «стало» — последний
+        cmp_old = st.selectbox(t.get("compare_old", "Old"), rec_ids, index=1, format_func=rec_label, key="cmp_old")
+        cmp_new = st.selectbox(t.get("compare_new", "New"), rec_ids, index=0, format_func=rec_label, key="cmp_new")
+        if st.button(t.get("compare_run", "Compare"), key="cmp_run"):
+            st.session_state["diff_pair"] = (cmp_old, cmp_new)
+
+# Sidebar: where does an ID appear across the whole history (SQLite index, no xlsx opened)
+if recs:
+    with st.sidebar.expander(t.get("id_search", "🔎 Find ID in history"), expanded=False):
+        pending = unindexed_records_db()
+        if pending:
+            st.caption(t.get("id_search_pending", "{count} older merges are not indexed yet.").format(count=len(pending)))
+            if st.button(t.get("id_search_index", "Index them"), key="idx_backfill"):
+                for rec in pending:
+                    try:
+                        index_record_ids_db(rec["id"], read_excel(rec["clean_path"], columns=["id"],
+                                                                  use_cache=False)["id"])
+                    except Exception as e:
+                        st.warning(f"{Path(rec['clean_path']).name}: {e}")
+                st.experimental_rerun()
+        id_query = st.text_input(t.get("id_search_input", "ID / phone"), value="", key="id_search_q")
+        if id_query.strip():
+            hits = find_id_db(id_query)
+            if hits:
+                for h in hits:
+                    st.markdown(f"**{h['basename']}** ({h['created_at']}) — "
+                                + t.get("id_search_row", "row {row}").format(row=h["row_offset"] + 2))
+            else:
+                st.caption(t.get("id_search_none", "Not found in saved merges."))
+
+diff_pair = st.session_state.get("diff_pair")
+if diff_pair and all(rid in recs_by_id for rid in diff_pair):
+    old_rec, new_rec = (recs_by_id[rid] for rid in diff_pair)
+    st.subheader(t.get("compare_title", "🆚 {old} → {new}").format(old=old_rec["basename"], new=new_rec["basename"]))
+    try:
+        paths = [Path(old_rec["clean_path"]), Path(new_rec["clean_path"])]
+        diff_args = (str(paths[0]), str(paths[1]), paths[0].stat().st_mtime, paths[1].stat().st_mtime)
+        with st.spinner(t.get("compare", "🆚 Compare two merges")):
+            diff = diff_records_cached(*diff_args)
+    except Exception as e:
+        st.error(t.get("error_compare", "Could not compare: {error}").format(error=e))
+    else:
+        summary = diff["summary"]
+        d1, d2, d3, d4 = st.columns(4)
+        d1.metric(t.get("diff_added", "Added"), f"{summary['added']:,}")
+        d2.metric(t.get("diff_removed", "Removed"), f"{summary['removed']:,}")
+        d3.metric(t.get("diff_changed", "Changed"), f"{summary['changed']:,}")
+        d4.metric(t.get("diff_unchanged", "Unchanged"), f"{summary['unchanged']:,}")
+        if summary["added_columns"] or summary["removed_columns"]:
+            st.caption(f"+ {', '.join(map(str, summary['added_columns'])) or '-'} / "
+                       f"− {', '.join(map(str, summary['removed_columns'])) or '-'}")
+        st.dataframe(diff["changed"].head(1000), use_container_width=True)
+        diff_name = f"diff_{old_rec['basename']}_{new_rec['basename']}"
+        e1, e2, e3 = st.columns(3)
+        # любой виджет перезапускает скрипт, поэтому выгрузки — по кнопке, дальше из кэша сравнений
+        export_ready = st.session_state.get("diff_export") == diff_args
+        if not export_ready:
+            with e1:
+                if st.button(t.get("compare_export", "📦 Prepare downloads"), key="dl_diff_prepare"):
+                    st.session_state["diff_export"] = diff_args
+                    export_ready = True
+        if export_ready:
+            with st.spinner(t.get("compare_export", "📦 Prepare downloads")):
+                with e1:
+                    st.download_button(f"⬇️ {diff_name}.xlsx", data=diff_export_cached("xlsx", *diff_args),
+                                       file_name=f"{diff_name}.xlsx", mime=XLSX_MIME, key="dl_diff_xlsx")
+                with e2:
+                    try:
+                        st.download_button(f"⬇️ {diff_name}.parquet", data=diff_export_cached("parquet", *diff_args),
+                                           file_name=f"{diff_name}.parquet", mime="application/octet-stream",
+                                           key="dl_diff_parquet")
+                    except Exception:
+                        # без pyarrow остаётся только xlsx
+                        pass
+        with e3:
+            if st.button(t.get("compare_close", "Close comparison"), key="cmp_close"):
+                st.session_state.pop("diff_pair", None)
+                st.session_state.pop("diff_export", None)
+                st.experimental_rerun()
+
 if not (uploaded and len(uploaded) >= 2):
     st.info(t["info_upload"])
     st.stop()
 
-# Read uploaded files (do not add to DB)
-raw_dfs, file_names = [], []
+# Memory budget: estimate every upload before parsing anything
+estimates = []
 for f in uploaded:
     try:
-        df = pd.read_excel(f)
+        estimates.append(estimate_workbook_bytes(f.getvalue()))
+    except Exception as e:
+        st.error(t["error_read"].format(name=f.name, error=e))
+        st.stop()
+if sum(estimates) > SESSION_MEMORY_BUDGET:
+    st.error(t.get("error_budget", "Files need about {need:,.0f} MB in memory, the limit is {limit:,.0f} MB. "
+                   "Upload fewer or smaller files.")
+             .format(need=sum(estimates) / MB, limit=SESSION_MEMORY_BUDGET / MB))
+    st.stop()
+
+# Read uploaded files (do not add to DB); parsing is admitted through the server-wide gate
+gate = get_ingest_gate()
+raw_dfs, file_names, file_hashes = [], [], []
+for f, est in zip(uploaded, estimates):
+    try:
+        raw = f.getvalue()
+        fh = content_hash(raw)
+        df = get_frame_cache().get(fh)
+        if df is None:
+            # разбор ждёт в общей очереди; кадр из кэша памяти не добавляет и очередь не занимает
+            with st.spinner(t.get("info_queue", "Waiting for memory to parse {name}…").format(name=f.name)):
+                with gate.admit(est, timeout=INGEST_WAIT_S) as admitted:
+                    if not admitted:
+                        st.error(t.get("error_queue", "Server is busy, {name} was not parsed. Try again later.")
+                                 .format(name=f.name))
+                        st.stop()
+                    df = read_excel_cached(fh, raw)
         raw_dfs.append(df)
         file_names.append(f.name)
+        file_hashes.append(fh)
     except Exception as e:
         st.error(t["error_read"].format(name=f.name, error=e))
         st.stop()
+st.caption(t.get("info_memory", "In memory: {used:,.1f} MB (estimated {est:,.1f} MB, limit {limit:,.0f} MB)")
+           .format(used=sum(frame_bytes(d) for d in raw_dfs) / MB, est=sum(estimates) / MB,
+                   limit=SESSION_MEMORY_BUDGET / MB))
+
+# Recipes: saved settings re-applied to new uploads (per-file steps by upload position)
+recipes = get_all_recipes_db()
+recipe_by_name = {r["name"]: r for r in recipes}
+with st.sidebar.expander(t.get("recipes", "📋 Merge recipes"), expanded=bool(recipes)):
+    recipe_choice = st.selectbox(t.get("recipe_apply", "Apply recipe"), options=["—"] + list(recipe_by_name),
+                                 index=0, key="recipe_choice")
+    if recipe_choice != "—":
+        st.caption(f"{recipe_by_name[recipe_choice]['updated_at']}")
+        if st.button(f"🗑️ Delete recipe {recipe_choice}", key="del_recipe"):
+            delete_recipe_db(recipe_by_name[recipe_choice]["id"])
+            st.experimental_rerun()
+active_recipe = recipe_by_name[recipe_choice]["config"] if recipe_choice != "—" else {}
+recipe_files = active_recipe.get("files", [])
+# widget keys depend on the recipe so that its defaults are actually applied
+rkey = step_hash({"recipe": recipe_choice})[:8]
+
+def _recipe_step(i: int) -> dict:
+    return recipe_files[i] if i < len(recipe_files) else {}
 
 # join type
-join_type = st.sidebar.selectbox(t["join_type"], ["outer","inner","left","right"], index=0)
+join_options = ["outer","inner","left","right"]
+recipe_join = active_recipe.get("join_type")
+join_type = st.sidebar.selectbox(t["join_type"], join_options,
+                                 index=join_options.index(recipe_join) if recipe_join in join_options else 0,
+                                 key=f"join_{rkey}")
+parallel_merge = MERGE_WORKERS > 1 and st.sidebar.checkbox(
+    t.get("parallel_merge", "⚡ Parallel merge ({workers} processes)").format(workers=MERGE_WORKERS),
+    value=False, key="parallel_merge")
 
 # Form: basename + ID/columns/filters
 st.subheader(t["id_select"])
@@ -543,35 +1057,52 @@ allow_overwrite = st.checkbox("Overwrite existing merged files with same name",
 id_cols = []
 include_cols_per_file = []
 filters_per_file = []
+recipe_filters_per_file = []
 
 with st.form("id_select_form"):
     for i, (df, name) in enumerate(zip(raw_dfs, file_names), start=1):
         cols = list(df.columns)
-        default_id = guess_id_column(df)
+        rstep = _recipe_step(i - 1)
+        rfilters = rstep.get("filters") or {}
+        default_id = rstep.get("id_col") if rstep.get("id_col") in cols else guess_id_column(df)
         col_id = st.selectbox(f"File {i}: {name}", options=cols,
                               index=cols.index(default_id) if default_id in cols else 0,
-                              help=t["id_help"], key=f"id_{i}")
+                              help=t["id_help"], key=f"id_{i}_{rkey}")
         id_cols.append(col_id)
 
-        include_cols = st.multiselect(f"{t['include_cols']} — {name}", options=cols, default=cols, key=f"inc_{i}")
+        default_inc = [c for c in rstep.get("include_cols", []) if c in cols] or cols
+        include_cols = st.multiselect(f"{t['include_cols']} — {name}", options=cols, default=default_inc,
+                                      key=f"inc_{i}_{rkey}")
         if col_id not in include_cols:
             include_cols = [col_id] + include_cols
         include_cols_per_file.append(include_cols)
 
         with st.expander(f"{t['filters']}: {name}", expanded=False):
             local_filters = {}
+            # в рецепт — только то, что пользователь сузил; нетронутый край диапазона = None,
+            # чтобы на файле следующей недели он открывался до новых min/max
+            recipe_filters = {}
             for c in include_cols:
                 s = df[c]
                 dtype = infer_dtype(s)
+                rf = rfilters.get(str(c)) or {}
                 if dtype == "number":
                     s_num = pd.to_numeric(s, errors="coerce")
                     if s_num.notna().any():
                         try:
                             vmin = float(np.nanmin(s_num))
                             vmax = float(np.nanmax(s_num))
+                            lo, hi = vmin, vmax
+                            if rf.get("type") == "number":
+                                r_lo, r_hi = rf.get("range", (None, None))
+                                lo = vmin if r_lo is None else min(max(float(r_lo), vmin), vmax)
+                                hi = vmax if r_hi is None else max(min(float(r_hi), vmax), lo)
                             rng = st.slider(f"{name} | {c}", min_value=float(vmin), max_value=float(vmax),
-                                            value=(float(vmin), float(vmax)), key=f"f_num_{i}_{c}")
+                                            value=(lo, hi), key=f"f_num_{i}_{c}_{rkey}")
                             local_filters[c] = {"type":"number", "range": rng}
+                            open_rng = (None if rng[0] <= vmin else rng[0], None if rng[1] >= vmax else rng[1])
+                            if open_rng != (None, None):
+                                recipe_filters[c] = {"type":"number", "range": open_rng}
                         except Exception:
                             pass
                 elif dtype == "datetime":
@@ -579,71 +1110,92 @@ with st.form("id_select_form"):
                     if s_dt.notna().any():
                         dmin = s_dt.min().date()
                         dmax = s_dt.max().date()
-                        rng = st.date_input(f"{name} | {c}", (dmin,dmax), key=f"f_dt_{i}_{c}")
+                        dval = (dmin, dmax)
+                        if rf.get("type") == "datetime":
+                            try:
+                                r_start, r_end = rf["range"]
+                                dval = (dmin if r_start is None else pd.to_datetime(r_start).date(),
+                                        dmax if r_end is None else pd.to_datetime(r_end).date())
+                            except Exception:
+                                pass
+                        rng = st.date_input(f"{name} | {c}", dval, key=f"f_dt_{i}_{c}_{rkey}")
                         if isinstance(rng, tuple) and len(rng)==2:
                             local_filters[c] = {"type":"datetime","range": rng}
+                            open_rng = (None if rng[0] <= dmin else rng[0], None if rng[1] >= dmax else rng[1])
+                            if open_rng != (None, None):
+                                recipe_filters[c] = {"type":"datetime", "range": open_rng}
                 elif dtype == "bool":
-                    val = st.selectbox(f"{name} | {c}", options=["—", True, False], index=0, key=f"f_bool_{i}_{c}")
+                    bool_opts = ["—", True, False]
+                    bidx = bool_opts.index(rf["value"]) if rf.get("type") == "bool" and rf.get("value") in (True, False) else 0
+                    val = st.selectbox(f"{name} | {c}", options=bool_opts, index=bidx, key=f"f_bool_{i}_{c}_{rkey}")
                     if val != "—":
                         local_filters[c] = {"type":"bool","value": val}
                 elif dtype == "category":
                     opts = sorted([("—NaN—" if pd.isna(x) else str(x)) for x in s.unique()])
-                    sel = st.multiselect(f"{name} | {c}", options=opts, default=[], key=f"f_cat_{i}_{c}")
+                    rsel = []
+                    if rf.get("type") == "category":
+                        rsel = [("—NaN—" if pd.isna(v) else str(v)) for v in rf.get("values", [])]
+                        rsel = [v for v in rsel if v in opts]
+                    sel = st.multiselect(f"{name} | {c}", options=opts, default=rsel, key=f"f_cat_{i}_{c}_{rkey}")
                     def back(x): return np.nan if x=="—NaN—" else x
                     if sel:
                         local_filters[c] = {"type":"category","values": list(map(back, sel))}
                 else:
-                    txt = st.text_input(f"{name} | {c}", value="", key=f"f_txt_{i}_{c}")
+                    rtxt = rf.get("contains", "") if rf.get("type") == "text" else ""
+                    txt = st.text_input(f"{name} | {c}", value=rtxt, key=f"f_txt_{i}_{c}_{rkey}")
                     if txt.strip():
                         local_filters[c] = {"type":"text", "contains": txt.strip()}
+            recipe_filters.update({c: f for c, f in local_filters.items() if f["type"] not in ("number", "datetime")})
             filters_per_file.append(local_filters)
+            recipe_filters_per_file.append(recipe_filters)
 
-    add_prefix = st.checkbox(t["prefix"], value=False)
-    fill_value = st.text_input(t["nan_fill"], value="-", key="nanfill")
+    add_prefix = st.checkbox(t["prefix"], value=bool(active_recipe.get("add_prefix", False)), key=f"prefix_{rkey}")
+    fill_value = st.text_input(t["nan_fill"], value=str(active_recipe.get("fill_value", "-")), key=f"nanfill_{rkey}")
+    recipe_name = st.text_input(t.get("recipe_save_as", "💾 Save these settings as recipe (name, optional)"),
+                                value="", key=f"recipe_name_{rkey}")
     submitted = st.form_submit_button(t["merge_button"])
 
 if not submitted:
     st.info(t["info_wait"])
     st.stop()
 
-# Apply selected columns and filters
+# Apply selected columns and filters (memoized per file content + step)
 prepared_dfs = []
-id_sets = []
 download_buffers = []
-
-for df, name, idc, include_cols, fdict in zip(raw_dfs, file_names, id_cols, include_cols_per_file, filters_per_file):
-    work = df.copy()
-    cols_to_keep = [c for c in include_cols if c in work.columns]
-    work = work[cols_to_keep].copy()
-    work_filtered = apply_filters(work, fdict)
-
-    if idc not in work_filtered.columns:
+recipe_steps = []
+cache_hits = 0
+
+for df, name, fh, idc, include_cols, fdict, rfdict in zip(raw_dfs, file_names, file_hashes, id_cols,
+                                                          include_cols_per_file, filters_per_file,
+                                                          recipe_filters_per_file):
+    step = build_prepare_step(name, idc, include_cols, fdict, add_prefix, fill_value)
+    recipe_steps.append({"id_col": idc, "include_cols": list(include_cols), "filters": rfdict})
+    try:
+        work_filtered, dup_count, hit = prepare_frame_memoized(fh, df, step)
+    except KeyError:
         st.error(t["error_no_id"].format(name=name))
         st.stop()
+    cache_hits += int(hit)
 
-    dup_count = work_filtered[idc].duplicated(keep="first").sum()
     if dup_count:
         st.warning(t["warn_duplicates"].format(name=name, count=int(dup_count)))
-        work_filtered = work_filtered.drop_duplicates(subset=[idc], keep="first").copy()
-
-    work_filtered["id"] = to_str_id(work_filtered[idc])
-
-    if add_prefix:
-        other_cols = [c for c in work_filtered.columns if c not in [idc, "id"]]
-        work_filtered = work_filtered.rename(columns={c: f"{name}__{c}" for c in other_cols})
-
-    if idc != "id":
-        work_filtered = work_filtered.drop(columns=[idc], errors="ignore")
-
-    work_filtered = work_filtered.fillna(fill_value)
 
     prepared_dfs.append(work_filtered)
-    id_sets.append(set(work_filtered["id"].tolist()))
-
-    buf = BytesIO()
-    work_filtered.to_excel(buf, index=False)
-    buf.seek(0)
-    download_buffers.append((name, buf))
+    download_buffers.append((name, to_xlsx_bytes(work_filtered)))
+
+if cache_hits:
+    st.caption(t.get("recipe_cache", "Reused {hits} of {total} prepared files from cache.")
+               .format(hits=cache_hits, total=len(prepared_dfs)))
+
+recipe_name = re.sub(r"\s+", " ", recipe_name or "").strip()
+if recipe_name:
+    save_recipe_db(recipe_name, {
+        "files": recipe_steps,
+        "join_type": join_type,
+        "add_prefix": bool(add_prefix),
+        "fill_value": fill_value,
+    })
+    st.success(t.get("recipe_saved", "Recipe «{name}» saved.").format(name=recipe_name))
 
 # verify id presence
 for i, dfp in enumerate(prepared_dfs, start=1):
@@ -651,23 +1203,22 @@ for i, dfp in enumerate(prepared_dfs, start=1):
         st.error(t["error_no_id"].format(name=file_names[i-1]))
         st.stop()
 
-# Merge
-try:
-    merged = reduce(lambda l,r: pd.merge(l, r, on="id", how=join_type), prepared_dfs)
-except Exception as e:
-    st.error(t["error_merge"].format(error=e))
-    st.stop()
-
-# presence, unmatched and sorting
-presence_cols = []
-for idx, (name, ids) in enumerate(zip(file_names, id_sets), start=1):
-    colname = f"__present_in_{idx}"
-    merged[colname] = merged["id"].isin(ids)
-    presence_cols.append(colname)
-
-merged["__present_count"] = merged[presence_cols].sum(axis=1)
-merged["__unmatched"] = merged["__present_count"] < len(prepared_dfs)
-merged_sorted = merged.sort_values(by=["__unmatched","id"]).reset_index(drop=True)
+# Merge + presence, unmatched and sorting; the merge holds memory too, so it goes through the same gate:
+# the result is about the size of the inputs, the parallel mode also copies the inputs into buckets
+merge_bytes = sum(frame_bytes(d) for d in prepared_dfs) * (2 if parallel_merge else 1)
+with gate.admit(merge_bytes, timeout=INGEST_WAIT_S) as admitted:
+    if not admitted:
+        st.error(t.get("error_queue_merge", "Server is busy, the merge was not started. Try again later."))
+        st.stop()
+    try:
+        if parallel_merge:
+            merged_sorted, presence_cols = merge_on_id_partitioned(prepared_dfs, how=join_type,
+                                                                   workers=MERGE_WORKERS)
+        else:
+            merged_sorted, presence_cols = merge_on_id(prepared_dfs, how=join_type)
+    except Exception as e:
+        st.error(t["error_merge"].format(error=e))
+        st.stop()
 
 # Analytics
 st.subheader(t["metrics"])
@@ -711,12 +1262,10 @@ colored_path = MERGED_DIR / colored_filename
 
 col1, col2 = st.columns(2)
 with col1:
-    out1 = BytesIO()
-    clean_df.to_excel(out1, index=False, engine="openpyxl")
-    out1.seek(0)
+    out1 = to_xlsx_bytes(clean_df)
     st.download_button(t["download_clean"].format(name=merge_basename), data=out1,
                        file_name=clean_filename,
-                       mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                       mime=XLSX_MIME,
                        key=f"dl_clean_{merge_basename}")
 
     if st.button(t["save_merged"], key=f"save_{merge_basename}"):
@@ -724,7 +1273,7 @@ with col1:
             saved_meta = save_merged_files_to_disk(merge_basename, clean_df, styled, merged_sorted, allow_overwrite=allow_overwrite)
             # add to DB
             rec_id = add_record_db(saved_meta["basename"], saved_meta["clean_path"], saved_meta["colored_path"],
-                                   saved_meta["rows"], saved_meta["cols"])
+                                   saved_meta["rows"], saved_meta["cols"], ids=clean_df["id"])
             st.success(f"Saved merged files as {saved_meta['basename']} and added to history (id={rec_id}).")
             st.experimental_rerun()
         except Exception as e:
@@ -740,7 +1289,7 @@ with col2:
         out2.seek(0)
         st.download_button(t["download_colored"].format(name=merge_basename), data=out2,
                            file_name=colored_filename,
-                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                           mime=XLSX_MIME,
                            key=f"dl_colored_{merge_basename}")
     except Exception as e:
         try:
@@ -749,7 +1298,7 @@ with col2:
             out2.seek(0)
             st.download_button(t["download_colored"].format(name=merge_basename), data=out2,
                                file_name=colored_filename,
-                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                               mime=XLSX_MIME,
                                key=f"dl_colored_fallback_{merge_basename}")
             st.warning(t["error_styled"].format(error=e))
         except Exception as e2:
@@ -761,7 +1310,7 @@ if auto_save:
         saved_meta = save_merged_files_to_disk(merge_basename, clean_df, styled, merged_sorted, allow_overwrite=allow_overwrite)
         # add to DB
         rec_id = add_record_db(saved_meta["basename"], saved_meta["clean_path"], saved_meta["colored_path"],
-                               saved_meta["rows"], saved_meta["cols"])
+                               saved_meta["rows"], saved_meta["cols"], ids=clean_df["id"])
         st.success(f"Auto-saved merged files as {saved_meta['basename']} and added to history (id={rec_id}).")
         st.experimental_rerun()
     except Exception as e:
@@ -771,7 +1320,7 @@ if auto_save:
 with st.expander(t["download_filtered_each"], expanded=False):
     for name, buf in download_buffers:
         st.download_button(f"⬇️ {name}", data=buf, file_name=f"filtered_{name}.xlsx",
-                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                           mime=XLSX_MIME,
                            key=f"dlf_{name}")
 
 with st.expander(t["expander"], expanded=False):
@@ -1,27 +1,54 @@
 import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import matplotlib.pyplot as plt
-from openai import OpenAI
-from dotenv import load_dotenv
+from data import PARQUET_AVAILABLE, clear_sidecar, fresh_sidecar, read_excel
+from insights import InsightClient, build_prompt
 
-# Load environment variables from .env
-load_dotenv()
+# matplotlib, pyarrow, openai and dotenv are imported only by the code paths that
+# need them, so `main.py describe` doesn't pay for plotting or the API client.
+
+_ENV_LOADED = False
+
+def load_env():
+    """Load environment variables from .env (once)"""
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _ENV_LOADED = True
 
 class ExcelAnalyzer:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, cache_dir: str = None, use_cache: bool = True,
+                 insights: InsightClient = None):
+        load_env()
         self.file_path = file_path
         self.df = None
+        self.cache_dir = cache_dir or os.getenv("KTNG_CACHE_DIR", ".ktng_cache")
+        self.use_cache = use_cache and PARQUET_AVAILABLE
+
+        # LLM client is created on first use, so a missing OPENAI_API_KEY only
+        # matters for ask_chatgpt (see insights.py for stub / local backends)
+        self._insights = insights
+
+    @property
+    def insights(self) -> InsightClient:
+        if self._insights is None:
+            self._insights = InsightClient()
+        return self._insights
 
-        # Load API key from environment
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("❌ OPENAI_API_KEY is not set. Add it to .env file.")
+    def clear_cache(self):
+        """Remove the Parquet sidecar of this workbook"""
+        clear_sidecar(self.file_path, self.cache_dir, strip=False)
 
-        self.client = OpenAI(api_key=api_key)
+    def load_data(self, columns=None):
+        """Load Excel file into pandas DataFrame.
 
-    def load_data(self):
-        """Load Excel file into pandas DataFrame"""
-        self.df = pd.read_excel(self.file_path)
+        With use_cache the parsed frame is kept as a Parquet sidecar (see data.reader),
+        so later loads skip the xlsx parse. `columns` loads only those columns.
+        """
+        self.df = read_excel(self.file_path, columns=columns, use_cache=self.use_cache, cache_dir=self.cache_dir)
         return self.df
 
     def basic_analysis(self):
@@ -30,23 +57,31 @@ class ExcelAnalyzer:
             raise ValueError("No data loaded. Call load_data() first.")
         return self.df.describe(include="all")
 
-    def ask_chatgpt(self, df: pd.DataFrame):
-        """Send dataframe summary to ChatGPT for analysis"""
-        summary = df.describe().to_string()
-
-        prompt = f"""
-        You are a data analyst. 
-        Analyze this dataset summary and provide insights, trends, or problems a business manager should know:
+    def streaming_analysis(self, chunksize: int = 50_000, workers: int = None, columns=None):
+        """Approximate describe(include="all") computed chunk by chunk across processes.
 
-        {summary}
+        Does not need load_data(): rows are streamed from the Parquet sidecar when it is
+        fresh, otherwise straight from the xlsx, so the file never has to fit in memory.
         """
+        from streaming_stats import describe_streaming, iter_excel_chunks, iter_parquet_chunks
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}]
-        )
+        parquet_path = fresh_sidecar(self.file_path, self.cache_dir, strip=False) if self.use_cache else None
+        if parquet_path is not None:
+            chunks = iter_parquet_chunks(parquet_path, chunksize, columns)
+        else:
+            chunks = iter_excel_chunks(self.file_path, chunksize, columns)
+        return describe_streaming(chunks, workers=workers)
 
-        return response.choices[0].message.content
+    def ask_chatgpt(self, df: pd.DataFrame):
+        """Send dataframe summary to ChatGPT for analysis (answers are cached on disk)"""
+        return self.insights.ask(build_prompt(df))
+
+    def ask_chatgpt_many(self, frames: dict):
+        """Insights for many files/sheets at once: {label: df} -> {label: answer or exception}.
+
+        Requests run concurrently (bounded by the client's concurrency) with retry and backoff.
+        """
+        return self.insights.ask_many({label: build_prompt(df) for label, df in frames.items()})
 
     def make_plot(self, group_col: str, value_col: str):
         """Generate bar chart grouped by one column"""
@@ -55,15 +90,74 @@ class ExcelAnalyzer:
 
         chart = self.df.groupby(group_col)[value_col].sum()
 
-        plt.figure(figsize=(6,4))
-        chart.plot(kind="bar")
-        plt.title(f"{value_col} by {group_col}")
-        plt.xlabel(group_col)
-        plt.ylabel(value_col)
-        plt.tight_layout()
-
         os.makedirs("dashboards", exist_ok=True)
         save_path = f"dashboards/{group_col}_{value_col}.png"
-        plt.savefig(save_path)
-        plt.close()
-        return save_path
+        return render_bar_chart((chart, group_col, value_col, save_path))
+
+    def make_dashboards(self, pairs, out_dir: str = "dashboards", workers: int = None, force: bool = False):
+        """Generate bar charts for many (group_col, value_col) pairs.
+
+        Aggregates with one groupby pass per group column, renders in worker processes
+        and skips charts whose aggregated data hash matches the last render.
+        Returns {(group_col, value_col): save_path}.
+        """
+        if self.df is None:
+            raise ValueError("No data loaded. Call load_data() first.")
+
+        by_group = {}
+        for group_col, value_col in pairs:
+            by_group.setdefault(group_col, [])
+            if value_col not in by_group[group_col]:
+                by_group[group_col].append(value_col)
+
+        os.makedirs(out_dir, exist_ok=True)
+        manifest_path = os.path.join(out_dir, ".manifest.json")
+        try:
+            with open(manifest_path, encoding="utf-8") as fh:
+                manifest = json.load(fh)
+        except (OSError, ValueError):
+            manifest = {}
+
+        paths, jobs, digests = {}, [], {}
+        for group_col, value_cols in by_group.items():
+            agg = self.df.groupby(group_col)[value_cols].sum()
+            for value_col in value_cols:
+                chart = agg[value_col]
+                save_path = os.path.join(out_dir, f"{group_col}_{value_col}.png")
+                paths[(group_col, value_col)] = save_path
+                digest = hashlib.sha256(pd.util.hash_pandas_object(chart, index=True).values.tobytes()).hexdigest()
+                digests[save_path] = digest
+                if not force and manifest.get(save_path) == digest and os.path.exists(save_path):
+                    continue
+                jobs.append((chart, group_col, value_col, save_path))
+
+        if len(jobs) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(render_bar_chart, jobs))
+        else:
+            for job in jobs:
+                render_bar_chart(job)
+
+        manifest.update(digests)
+        with open(manifest_path, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=1)
+        return paths
+
+
+def render_bar_chart(job):
+    """Render one aggregated series to PNG on the headless Agg backend (picklable for workers)"""
+    chart, group_col, value_col, save_path = job
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(6,4))
+    chart.plot(kind="bar")
+    plt.title(f"{value_col} by {group_col}")
+    plt.xlabel(group_col)
+    plt.ylabel(value_col)
+    plt.tight_layout()
+
+    plt.savefig(save_path)
+    plt.close(fig)
+    return save_path
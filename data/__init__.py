@@ -0,0 +1,56 @@
+"""Shared data core: cached Excel reading, key canonicalization, joins and writers.
+
+All entry points (main.py/analyzer.py, Final/excel_merger.py, "new column.py",
+"Exel exchange/Exel.py") read and write workbooks through this package, so an
+optimization here speeds up every workflow; `python -m data.bench FILE` times it.
+"""
+from data.reader import (
+    PARQUET_AVAILABLE,
+    clear_sidecar,
+    content_hash,
+    file_sha256,
+    fresh_sidecar,
+    prune_cache,
+    read_excel,
+    read_excel_bytes,
+    strip_columns,
+)
+from data.keys import build_key_index, canonical_phone, to_str_id
+from data.memory import MB, FrameCache, IngestGate, budget_from_env, downcast_frame, estimate_workbook_bytes, frame_bytes
+from data.diff import diff_frames, diff_to_parquet_bytes, diff_to_xlsx_bytes
+from data.join import DUP_POLICIES, gather_left, merge_on_id, merge_on_id_partitioned, reduce_duplicates
+from data.writers import XLSX_MIME, to_xlsx_bytes, write_styled_xlsx, write_xlsx
+
+__all__ = [
+    "PARQUET_AVAILABLE",
+    "clear_sidecar",
+    "content_hash",
+    "file_sha256",
+    "fresh_sidecar",
+    "prune_cache",
+    "read_excel",
+    "read_excel_bytes",
+    "strip_columns",
+    "build_key_index",
+    "canonical_phone",
+    "to_str_id",
+    "MB",
+    "FrameCache",
+    "IngestGate",
+    "budget_from_env",
+    "downcast_frame",
+    "estimate_workbook_bytes",
+    "frame_bytes",
+    "diff_frames",
+    "diff_to_parquet_bytes",
+    "diff_to_xlsx_bytes",
+    "DUP_POLICIES",
+    "gather_left",
+    "merge_on_id",
+    "merge_on_id_partitioned",
+    "reduce_duplicates",
+    "XLSX_MIME",
+    "to_xlsx_bytes",
+    "write_styled_xlsx",
+    "write_xlsx",
+]
@@ -0,0 +1,48 @@
+"""Reader benchmark: python -m data.bench FILE [FILE ...] [--repeat N]
+
+Times a plain pd.read_excel against data.read_excel cold (sidecar rebuilt) and
+warm (sidecar hit), so reader changes can be measured for every entry point at once.
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from data.reader import clear_sidecar, read_excel
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_file(path: str, repeat: int = 3) -> dict:
+    def cold():
+        clear_sidecar(path, strip=False)
+        read_excel(path)
+
+    result = {
+        "file": path,
+        "pandas_read_excel_s": _best(lambda: pd.read_excel(path), repeat),
+        "cold_s": _best(cold, repeat),
+        "warm_s": _best(lambda: read_excel(path), repeat),
+    }
+    result["speedup"] = result["pandas_read_excel_s"] / result["warm_s"] if result["warm_s"] else float("nan")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    rows = [bench_file(f, args.repeat) for f in args.files]
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Row-level diff of two merged results aligned on `id`, via vectorized per-row hashes."""
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from data.keys import to_str_id
+
+
+def _aligned_columns(old: pd.Series, new: pd.Series):
+    # the same column can be read as int one month and as float/str the next;
+    # cast both sides to a common type, otherwise equal values hash differently
+    if old.dtype == new.dtype:
+        return old, new
+    if pd.api.types.is_numeric_dtype(old) and pd.api.types.is_numeric_dtype(new):
+        return old.astype("float64"), new.astype("float64")
+    return old.astype(str), new.astype(str)
+
+
+def _hash(s: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(s, index=False).to_numpy()
+
+
+def diff_frames(old: pd.DataFrame, new: pd.DataFrame, key: str = "id") -> dict:
+    """Compare two merge results on `key`.
+
+    A row is added when its ID is only in new, removed when only in old, and changed
+    when the ID is in both but at least one shared column differs. Rows are compared
+    by 64-bit hashes (pd.util.hash_pandas_object), with no per-row loop. Repeated IDs
+    (a merge result has none) collapse to their first row.
+
+    Returns a dict: added/removed hold the whole rows, changed is a long table
+    (key, column, old, new) with one row per changed cell, summary holds the counts
+    and the lists of added/removed columns.
+    """
+    old = old.assign(**{key: to_str_id(old[key])}).drop_duplicates(subset=[key]).reset_index(drop=True)
+    new = new.assign(**{key: to_str_id(new[key])}).drop_duplicates(subset=[key]).reset_index(drop=True)
+
+    # match the keys once, everything after that is positional
+    pos = pd.Index(old[key]).get_indexer(new[key])
+    new_pos = np.flatnonzero(pos >= 0)
+    old_pos = pos[new_pos]
+    in_new = np.zeros(len(old), dtype=bool)
+    in_new[old_pos] = True
+
+    common = [c for c in new.columns if c in old.columns and c != key]
+    old_both = old[common].take(old_pos)
+    new_both = new[common].take(new_pos)
+    # hash per column rather than per row: the same hashes also tell which cells changed
+    cell_changed = np.zeros((len(new_pos), len(common)), dtype=bool)
+    for j, c in enumerate(common):
+        o, n = _aligned_columns(old_both[c], new_both[c])
+        cell_changed[:, j] = _hash(o) != _hash(n)
+    row_changed = cell_changed.any(axis=1)
+
+    both_keys = new[key].to_numpy()[new_pos]
+    parts = []
+    for j, c in enumerate(common):
+        r = np.flatnonzero(cell_changed[:, j])
+        if len(r):
+            parts.append(pd.DataFrame({
+                key: both_keys[r],
+                "column": c,
+                "old": old_both[c].to_numpy(dtype=object)[r],
+                "new": new_both[c].to_numpy(dtype=object)[r],
+                "_row": r,
+            }))
+    if parts:
+        changed = pd.concat(parts, ignore_index=True).sort_values("_row", kind="stable").drop(columns="_row")
+    else:
+        changed = pd.DataFrame(columns=[key, "column", "old", "new"])
+
+    summary = {
+        "old_rows": int(len(old)),
+        "new_rows": int(len(new)),
+        "added": int((pos < 0).sum()),
+        "removed": int((~in_new).sum()),
+        "changed": int(row_changed.sum()),
+        "unchanged": int(len(new_pos) - row_changed.sum()),
+        "changed_cells": int(len(changed)),
+        "added_columns": [c for c in new.columns if c not in old.columns],
+        "removed_columns": [c for c in old.columns if c not in new.columns],
+    }
+    return {
+        "summary": summary,
+        "added": new[pos < 0].reset_index(drop=True),
+        "removed": old[~in_new].reset_index(drop=True),
+        "changed": changed,
+    }
+
+
+def summary_frame(diff: dict) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(k, ", ".join(map(str, v)) if isinstance(v, list) else v) for k, v in diff["summary"].items()],
+        columns=["metric", "value"],
+    )
+
+
+def diff_to_xlsx_bytes(diff: dict) -> BytesIO:
+    """Workbook with summary/added/removed/changed sheets (ready for st.download_button)."""
+    buf = BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        summary_frame(diff).to_excel(writer, sheet_name="summary", index=False)
+        for name in ("added", "removed", "changed"):
+            diff[name].to_excel(writer, sheet_name=name, index=False)
+    buf.seek(0)
+    return buf
+
+
+def diff_to_parquet_bytes(diff: dict) -> BytesIO:
+    """All differences as one columnar table: key, status, column, old, new.
+
+    For added/removed rows column is empty; their values are in the xlsx export.
+    old/new are stored as strings, since different columns have different types.
+    """
+    key = diff["changed"].columns[0]
+    frames = [diff["changed"].assign(status="changed")]
+    for status in ("added", "removed"):
+        frames.append(pd.DataFrame({key: diff[status][key], "status": status}))
+    out = pd.concat(frames, ignore_index=True)[[key, "status", "column", "old", "new"]]
+    for c in ("column", "old", "new"):
+        out[c] = out[c].astype("string")
+    buf = BytesIO()
+    out.to_parquet(buf, index=False)
+    buf.seek(0)
+    return buf
@@ -0,0 +1,157 @@
+"""Joins shared by the entry points: multi-file merge on `id` and indexed lookups."""
+import os
+import sys
+import threading
+import types
+from contextlib import contextmanager
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+DUP_POLICIES = ("first", "last", "aggregate", "count")
+
+_WORKER_START_LOCK = threading.Lock()
+
+
+def _isin(keys: pd.Series, other: pd.Series) -> np.ndarray:
+    """keys.isin(other) through a shared factorization.
+
+    Series.isin on pandas (Arrow) strings walks the values one by one in Python;
+    factorize codes are compared as arrays. NaN matches NaN, as with isin.
+    """
+    codes, uniques = pd.factorize(pd.concat([keys, other], ignore_index=True), use_na_sentinel=False)
+    present = np.zeros(len(uniques), dtype=bool)
+    present[codes[len(keys):]] = True
+    return present[codes[:len(keys)]]
+
+
+def merge_on_id(frames, how: str = "outer", key: str = "id"):
+    """Merge prepared frames on `key` and add the bookkeeping columns.
+
+    __present_in_N: the ID is in file N; __present_count: in how many files;
+    __unmatched: missing from at least one. Unmatched rows go last.
+    Returns (sorted frame, list of __present_in_N columns).
+    """
+    merged = reduce(lambda l, r: pd.merge(l, r, on=key, how=how), frames)
+
+    presence_cols = []
+    for idx, frame in enumerate(frames, start=1):
+        colname = f"__present_in_{idx}"
+        merged[colname] = _isin(merged[key], frame[key])
+        presence_cols.append(colname)
+
+    merged["__present_count"] = merged[presence_cols].sum(axis=1)
+    merged["__unmatched"] = merged["__present_count"] < len(frames)
+    merged_sorted = merged.sort_values(by=["__unmatched", key]).reset_index(drop=True)
+    return merged_sorted, presence_cols
+
+
+def _bucket_of(keys: pd.Series, partitions: int) -> np.ndarray:
+    # hash the value, not the dtype: the same ID from different files lands in the same bucket
+    return pd.util.hash_array(keys.to_numpy(dtype=object)) % np.uint64(partitions)
+
+
+@contextmanager
+def _workers_skip_main():
+    """Worker processes started inside the block do not re-run the parent's __main__.
+
+    forkserver and spawn workers re-run __main__ from its __file__. Under `streamlit run`
+    that is the app script itself, so every worker would rerun the whole app and the
+    pool would break. While workers launch, __main__ is a bare module (no file, no spec),
+    which multiprocessing leaves alone, as in an interactive session; the jobs only need
+    data.join. The lock keeps concurrent sessions from interleaving the swap.
+    """
+    with _WORKER_START_LOCK:
+        main = sys.modules["__main__"]
+        bare = types.ModuleType("__main__")
+        sys.modules["__main__"] = bare
+        try:
+            yield
+        finally:
+            # Streamlit may have started another script run meanwhile; keep its __main__
+            if sys.modules.get("__main__") is bare:
+                sys.modules["__main__"] = main
+
+
+def merge_on_id_partitioned(frames, how: str = "outer", key: str = "id", partitions: int = None,
+                            workers: int = None):
+    """Same as merge_on_id, but in parts on several cores.
+
+    Every frame is split by the hash of `key` into `partitions` buckets. An ID lies
+    entirely in one bucket, so the merge and the presence columns are computed per
+    bucket independently (one process per bucket), and the concatenation is re-sorted
+    by __unmatched and `key`. The result equals merge_on_id.
+
+    Workers are started with forkserver (or spawn) and never import the caller's
+    __main__, so it is safe to call from a Streamlit script or an unguarded one.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    partitions = partitions or workers
+    if partitions <= 1:
+        return merge_on_id(frames, how=how, key=key)
+
+    buckets = [_bucket_of(f[key], partitions) for f in frames]
+    jobs = [[f[b == p] for f, b in zip(frames, buckets)] for p in range(partitions)]
+    # not fork: inside a multithreaded server (Streamlit) the child can inherit a held lock
+    context = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                                          else "spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, partitions), mp_context=context) as pool:
+        # map submits every job at once, and the pool launches its workers on submit
+        with _workers_skip_main():
+            results = pool.map(merge_on_id, jobs, [how] * partitions, [key] * partitions)
+        parts = list(results)
+
+    merged = pd.concat([m for m, _ in parts], ignore_index=True)
+    merged_sorted = merged.sort_values(by=["__unmatched", key]).reset_index(drop=True)
+    return merged_sorted, parts[0][1]
+
+
+def gather_left(base: pd.DataFrame, base_keys: pd.Series, ref: pd.DataFrame, index: dict) -> pd.DataFrame:
+    """Left join of base with ref through a prebuilt index: key -> ref row positions.
+
+    Row order and multiplication are as with pd.merge(how="left"); unmatched ref
+    rows are not touched.
+    """
+    left_pos, right_pos = [], []
+    for i, k in enumerate(base_keys):
+        pos = index.get(k)
+        if pos is None:
+            left_pos.append(i)
+            right_pos.append(-1)
+        else:
+            left_pos.extend([i] * len(pos))
+            right_pos.extend(pos)
+
+    left = base.iloc[left_pos].reset_index(drop=True)
+    # -1 means not in the index -> a row of NaN, as with how="left"
+    right = ref.reindex(np.asarray(right_pos, dtype=np.int64)).reset_index(drop=True)
+    return pd.concat([left, right], axis=1)
+
+
+def reduce_duplicates(frame: pd.DataFrame, keys: pd.Series, policy: str = "first"):
+    """One row per key. first/last: the first/last row; aggregate: sums of the numeric
+    columns, the first value of the others and the row count; count: the row count only.
+
+    Blank keys are dropped. Returns (frame indexed by key, rows per key).
+    """
+    if policy not in DUP_POLICIES:
+        raise ValueError(f"Unknown duplicate policy: {policy}")
+    has_key = (keys != "").to_numpy()
+    frame, keys = frame[has_key], keys[has_key]
+    counts = keys.value_counts()
+
+    if policy in ("first", "last"):
+        keep = ~keys.duplicated(keep=policy)
+        reduced = frame[keep.to_numpy()].set_axis(keys[keep].to_numpy())
+    elif policy == "count":
+        reduced = counts.rename("count").to_frame()
+    else:
+        numeric = frame.select_dtypes("number").columns
+        agg = {c: ("sum" if c in numeric else "first") for c in frame.columns}
+        reduced = frame.groupby(keys.to_numpy(), sort=False).agg(agg) if agg else pd.DataFrame(index=counts.index)
+        reduced["count"] = counts
+    return reduced, counts
@@ -0,0 +1,19 @@
+"""Key canonicalization shared by the merger, the lookup scripts and the history index."""
+import pandas as pd
+
+
+def to_str_id(series: pd.Series) -> pd.Series:
+    """ID as a string without surrounding whitespace (the merge key in excel_merger)."""
+    return series.astype(str).str.strip()
+
+
+def canonical_phone(s: pd.Series) -> pd.Series:
+    """Phone -> digits only (998901234567.0, '+998 90 123-45-67' -> '998901234567')."""
+    s = s.astype("string").str.strip().str.replace(r"\.0+$", "", regex=True)
+    return s.str.replace(r"\D+", "", regex=True).fillna("")
+
+
+def build_key_index(keys: pd.Series) -> dict:
+    """Key -> array of row positions (blank keys are skipped)."""
+    groups = pd.Series(range(len(keys))).groupby(keys.to_numpy(), sort=False).indices
+    return {k: v for k, v in groups.items() if k != ""}
@@ -0,0 +1,201 @@
+"""Memory budgeting for ingest: size estimates before parsing, compact dtypes, admission control."""
+import os
+import sys
+import threading
+from collections import OrderedDict
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+MB = 1024 * 1024
+
+# bytes per cell as df.memory_usage(deep=True) counts them: numbers and dates take 8;
+# pandas 3 (Arrow) strings take their UTF-8 length + an 8-byte offset; object strings
+# (no pyarrow) take a pointer + the str object; mixed columns a pointer + a Python object
+NUMERIC_CELL_BYTES = 8
+ARROW_STRING_OVERHEAD = 8
+OBJECT_STRING_OVERHEAD = 8 + 49
+SAMPLE_ROWS = 200
+ARROW_STRINGS = getattr(pd.Series(["a"]).dtype, "storage", None) == "pyarrow"
+
+
+def _source(source):
+    return BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _numeric_text(v: str) -> bool:
+    try:
+        float(v)
+        return True
+    except ValueError:
+        return False
+
+
+def _column_cell_bytes(values) -> float:
+    present = [v for v in values if v is not None]
+    if not present:
+        return NUMERIC_CELL_BYTES  # an empty column is read as float NaN
+    filled = len(present) / len(values)
+    if all(isinstance(v, bool) for v in present):
+        return 1 if filled == 1 else NUMERIC_CELL_BYTES + sys.getsizeof(True)
+    if all(isinstance(v, (int, float, datetime)) and not isinstance(v, bool) for v in present):
+        return NUMERIC_CELL_BYTES
+    if all(isinstance(v, str) for v in present):
+        if all(_numeric_text(v) for v in present):
+            return NUMERIC_CELL_BYTES  # read_excel turns numeric text ("998901234567") into a number
+        avg_len = sum(len(v.encode("utf-8")) for v in present) / len(present)
+        if ARROW_STRINGS:
+            return ARROW_STRING_OVERHEAD + avg_len * filled
+        return 8 + (OBJECT_STRING_OVERHEAD - 8 + avg_len) * filled
+    return 8 + sum(sys.getsizeof(v) for v in present) / len(present) * filled
+
+
+def estimate_workbook_bytes(source) -> int:
+    """Memory of the first xlsx sheet after pd.read_excel, without parsing every cell.
+
+    Rows and columns come from the <dimension> tag, bytes per cell from the value
+    types of each column in the first SAMPLE_ROWS rows (as frame_bytes measures right
+    after reading, before downcast_frame). Without a dimension, the sheet XML size.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(_source(source), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows, cols = ws.max_row, ws.max_column
+        sample = list(ws.iter_rows(min_row=2, max_row=SAMPLE_ROWS + 1, values_only=True))
+    finally:
+        wb.close()
+
+    if not (rows and cols):
+        return _xml_size(source)
+    data_rows = max(rows - 1, 0)  # the first row is the header
+    per_row = 0.0
+    for j in range(cols):
+        column = [r[j] if j < len(r) else None for r in sample]
+        per_row += _column_cell_bytes(column) if column else NUMERIC_CELL_BYTES
+    return int(data_rows * per_row)
+
+
+def _xml_size(source) -> int:
+    with zipfile.ZipFile(_source(source)) as zf:
+        sizes = {i.filename: i.file_size for i in zf.infolist() if i.filename.startswith("xl/worksheets/")}
+    return int(sizes.get("xl/worksheets/sheet1.xml", max(sizes.values(), default=0)))
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def downcast_frame(df: pd.DataFrame, category_ratio: float = 0.5) -> pd.DataFrame:
+    """Shrink a frame's memory without losing values.
+
+    Integers go to the smallest integer type, floats to float32 only when the values
+    round-trip exactly; string columns with fewer unique values than category_ratio
+    of the rows are dictionary-encoded (category).
+    """
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+            out[col] = s
+        elif pd.api.types.is_integer_dtype(s):
+            out[col] = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s):
+            s32 = s.astype(np.float32)
+            out[col] = s32 if ((s32.astype(s.dtype) == s) | s.isna()).all() else s
+        elif pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+            n = len(s)
+            if n and s.nunique(dropna=True) <= n * category_ratio:
+                out[col] = s.astype("category")
+            else:
+                out[col] = s
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+class FrameCache:
+    """Thread-safe LRU bounded by the total size of its values in bytes.
+
+    A value larger than the whole limit is not cached. sizeof gives a value's size
+    (frame_bytes by default).
+    """
+
+    def __init__(self, max_bytes: int, sizeof=frame_bytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.nbytes -= evicted
+
+    def __len__(self):
+        return len(self._items)
+
+
+class IngestGate:
+    """Limit, shared by all sessions, on the bytes being parsed into memory at once.
+
+    A request that does not fit waits in line for memory to be released, up to timeout.
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes: int, timeout: float = None) -> bool:
+        # a request larger than the whole limit is let through once nobody else is loading
+        need = min(nbytes, self.limit_bytes)
+        with self._cond:
+            ok = self._cond.wait_for(lambda: self.in_use + need <= self.limit_bytes, timeout=timeout)
+            if ok:
+                self.in_use += need
+            return ok
+
+    def release(self, nbytes: int):
+        with self._cond:
+            self.in_use -= min(nbytes, self.limit_bytes)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, nbytes: int, timeout: float = None):
+        ok = self.acquire(nbytes, timeout)
+        try:
+            yield ok
+        finally:
+            if ok:
+                self.release(nbytes)
+
+
+def budget_from_env(name: str, default_mb: int) -> int:
+    try:
+        return int(float(os.getenv(name, default_mb)) * MB)
+    except ValueError:
+        return default_mb * MB
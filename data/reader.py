@@ -0,0 +1,239 @@
+"""Excel reader shared by all entry points, with a Parquet sidecar cache.
+
+Parsed frames are stored as Parquet under KTNG_CACHE_DIR (default .ktng_cache).
+Files on disk are keyed by path + read options and validated by size and mtime;
+uploaded bytes are keyed by their content hash. Hits are read memory-mapped and
+can project only the requested columns.
+
+The cache holds copies of the workbooks' data, so it is bounded: after every write,
+entries unused for KTNG_CACHE_MAX_AGE_H hours (default 168) are removed, then the
+least recently used ones until it fits in KTNG_CACHE_MAX_MB (default 1024).
+One-shot scripts should read with use_cache=False.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import time
+from io import BytesIO
+
+import pandas as pd
+
+# pyarrow is optional: without it every read parses the workbook
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+def default_cache_dir() -> str:
+    return os.getenv("KTNG_CACHE_DIR", ".ktng_cache")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# the only names the cache writes: <sha1 key>.parquet, <key>.json and <key>.parquet.<pid>.tmp
+_SIDECAR_NAME = re.compile(r"([0-9a-f]{40})\.(?:parquet|json|parquet\.\d+\.tmp)")
+
+
+def prune_cache(cache_dir=None, max_bytes: int = None, max_age_s: float = None) -> int:
+    """Evict sidecars by age, then least recently used first until under max_bytes; returns files removed
+
+    An entry's age is the mtime of its newest file; hits refresh it (see _touch).
+    Only sidecar file names are considered, so a KTNG_CACHE_DIR pointed at a folder
+    with other files never loses them.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    if max_bytes is None:
+        max_bytes = int(_env_float("KTNG_CACHE_MAX_MB", 1024) * 1024 * 1024)
+    if max_age_s is None:
+        max_age_s = _env_float("KTNG_CACHE_MAX_AGE_H", 168) * 3600
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return 0
+
+    # key -> [files, total size, last use]; .parquet, .json and leftover .tmp of one key go together
+    entries = {}
+    for name in names:
+        match = _SIDECAR_NAME.fullmatch(name)
+        if match is None:
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if not os.path.isfile(path):
+            continue
+        entry = entries.setdefault(match.group(1), [[], 0, 0.0])
+        entry[0].append(path)
+        entry[1] += st.st_size
+        entry[2] = max(entry[2], st.st_mtime)
+
+    now = time.time()
+    total = sum(e[1] for e in entries.values())
+    removed = 0
+    for files, size, last_used in sorted(entries.values(), key=lambda e: e[2]):
+        if now - last_used <= max_age_s and total <= max_bytes:
+            break
+        for path in files:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        total -= size
+    return removed
+
+
+def _touch(path: str):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def strip_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip surrounding whitespace from column names (non-string names are left alone)."""
+    df.columns = [c.strip() if isinstance(c, str) else c for c in df.columns]
+    return df
+
+
+def _spec_key(source_id: str, read_kwargs: dict) -> str:
+    spec = json.dumps([source_id, read_kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(spec.encode("utf-8")).hexdigest()
+
+
+def _signature(path) -> dict:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def sidecar_paths(path, cache_dir=None, **read_kwargs):
+    """(parquet, metadata) sidecar paths for a workbook read with these options"""
+    key = _spec_key(os.path.abspath(path), read_kwargs)
+    cache_dir = cache_dir or default_cache_dir()
+    return os.path.join(cache_dir, f"{key}.parquet"), os.path.join(cache_dir, f"{key}.json")
+
+
+def clear_sidecar(path, cache_dir=None, **read_kwargs):
+    for p in sidecar_paths(path, cache_dir, **read_kwargs):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def fresh_sidecar(path, cache_dir=None, **read_kwargs):
+    """Parquet path if the sidecar matches the file's current size/mtime; stale ones are removed"""
+    parquet_path, meta_path = sidecar_paths(path, cache_dir, **read_kwargs)
+    if not (os.path.exists(parquet_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, encoding="utf-8") as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        meta = None
+    if meta != _signature(path):
+        clear_sidecar(path, cache_dir, **read_kwargs)
+        return None
+    return parquet_path
+
+
+def _write_sidecar(df: pd.DataFrame, parquet_path: str, meta_path: str, meta: dict):
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+    tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, parquet_path)
+        with open(meta_path, "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+    except Exception:
+        # e.g. mixed-type object columns Arrow can't encode — just skip caching
+        for p in (tmp_path, parquet_path, meta_path):
+            if os.path.exists(p):
+                os.remove(p)
+    prune_cache(os.path.dirname(parquet_path))
+
+
+def _read_parquet(parquet_path: str, columns=None):
+    try:
+        # memory_map lets pyarrow read column chunks straight from the page cache
+        df = pd.read_parquet(parquet_path, columns=list(columns) if columns is not None else None,
+                             memory_map=True)
+    except Exception:
+        return None
+    _touch(parquet_path)  # last use, for prune_cache
+    return df
+
+
+def _usecols(columns, strip: bool):
+    if columns is None:
+        return None
+    wanted = set(columns)
+    if strip:
+        return lambda c: str(c).strip() in wanted
+    return lambda c: c in wanted
+
+
+def read_excel(path, columns=None, use_cache: bool = True, cache_dir=None, strip: bool = False,
+               **read_kwargs) -> pd.DataFrame:
+    """pd.read_excel with a Parquet sidecar cache.
+
+    With the cache the whole sheet is parsed once and `columns` are projected from the
+    sidecar; without it only `columns` are parsed. `strip` trims column names
+    (and matches `columns` against trimmed names). Other kwargs go to pd.read_excel.
+    """
+    if not (use_cache and PARQUET_AVAILABLE):
+        df = pd.read_excel(path, usecols=_usecols(columns, strip), **read_kwargs)
+        return strip_columns(df) if strip else df
+
+    spec = dict(read_kwargs, strip=strip)
+    parquet_path = fresh_sidecar(path, cache_dir, **spec)
+    if parquet_path is not None:
+        df = _read_parquet(parquet_path, columns)
+        if df is not None:
+            return df
+    df = pd.read_excel(path, **read_kwargs)
+    if strip:
+        strip_columns(df)
+    parquet_path, meta_path = sidecar_paths(path, cache_dir, **spec)
+    _write_sidecar(df, parquet_path, meta_path, _signature(path))
+    return df if columns is None else df[list(columns)]
+
+
+def read_excel_bytes(data: bytes, columns=None, use_cache: bool = True, cache_dir=None, strip: bool = False,
+                     content_id: str = None, **read_kwargs) -> pd.DataFrame:
+    """Like read_excel for uploaded bytes; the sidecar is keyed by the content hash"""
+    if not (use_cache and PARQUET_AVAILABLE):
+        df = pd.read_excel(BytesIO(data), usecols=_usecols(columns, strip), **read_kwargs)
+        return strip_columns(df) if strip else df
+
+    content_id = content_id or content_hash(data)
+    key = _spec_key(f"sha256:{content_id}", dict(read_kwargs, strip=strip))
+    cache_dir = cache_dir or default_cache_dir()
+    parquet_path = os.path.join(cache_dir, f"{key}.parquet")
+    meta_path = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(parquet_path) and os.path.exists(meta_path):
+        df = _read_parquet(parquet_path, columns)
+        if df is not None:
+            return df
+    df = pd.read_excel(BytesIO(data), **read_kwargs)
+    if strip:
+        strip_columns(df)
+    _write_sidecar(df, parquet_path, meta_path, {"sha256": content_id})
+    return df if columns is None else df[list(columns)]
@@ -0,0 +1,36 @@
+"""Excel writers shared by the entry points."""
+import os
+from io import BytesIO
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def to_xlsx_bytes(df, index: bool = False) -> BytesIO:
+    """Frame -> in-memory xlsx (ready for st.download_button)."""
+    buf = BytesIO()
+    df.to_excel(buf, index=index, engine="openpyxl")
+    buf.seek(0)
+    return buf
+
+
+def write_xlsx(df, path, index: bool = False) -> str:
+    """Save a frame as xlsx, creating the folder if needed."""
+    folder = os.path.dirname(str(path))
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    df.to_excel(path, index=index, engine="openpyxl")
+    return str(path)
+
+
+def write_styled_xlsx(styled, fallback_df, target) -> bool:
+    """Write a Styler (with highlighting), else the plain frame. True if the highlighting was kept."""
+    if styled is not None:
+        try:
+            styled.to_excel(target, engine="openpyxl", index=False)
+            return True
+        except Exception:
+            if hasattr(target, "seek"):
+                target.seek(0)
+                target.truncate()
+    fallback_df.to_excel(target, index=False, engine="openpyxl")
+    return False
@@ -0,0 +1,191 @@
+"""LLM insights for ExcelAnalyzer: pluggable backends, on-disk cache, async fan-out.
+
+Backends expose `complete(model, prompt)` and `async acomplete(model, prompt)`.
+`KTNG_LLM_BACKEND=stub` serves canned answers for tests and offline runs;
+`OPENAI_BASE_URL` points the OpenAI backend at a local stand-in endpoint.
+"""
+import os
+import json
+import random
+import asyncio
+import hashlib
+import time
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+def build_prompt(df) -> str:
+    """Prompt for one dataset, built from its describe() summary"""
+    summary = df.describe().to_string()
+
+    return f"""
+        You are a data analyst.
+        Analyze this dataset summary and provide insights, trends, or problems a business manager should know:
+
+        {summary}
+        """
+
+
+class ResponseCache:
+    """One JSON file per (model, prompt hash) under cache_dir"""
+
+    def __init__(self, cache_dir: str = None):
+        # resolved at construction so values from .env (loaded lazily) are honoured
+        self.cache_dir = cache_dir or os.path.join(os.getenv("KTNG_CACHE_DIR", ".ktng_cache"), "llm")
+
+    def _path(self, model: str, prompt: str) -> str:
+        key = hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, model: str, prompt: str):
+        try:
+            with open(self._path(model, prompt), encoding="utf-8") as fh:
+                return json.load(fh)["content"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, model: str, prompt: str, content: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(model, prompt)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"model": model, "content": content, "created_at": time.time()}, fh, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class OpenAIBackend:
+    """OpenAI chat completions; clients are created on first use"""
+
+    def __init__(self, api_key: str = None, base_url: str = None):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self._client = None
+        self._async_client = None
+
+    def _kwargs(self):
+        if not self.api_key and not self.base_url:
+            raise ValueError("❌ OPENAI_API_KEY is not set. Add it to .env file.")
+        # local stand-in endpoints usually accept any key
+        return {"api_key": self.api_key or "local", "base_url": self.base_url}
+
+    def complete(self, model: str, prompt: str) -> str:
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(**self._kwargs())
+        response = self._client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content
+
+    async def acomplete(self, model: str, prompt: str) -> str:
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(**self._kwargs())
+        response = await self._async_client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.choices[0].message.content
+
+    def is_retryable(self, exc: Exception) -> bool:
+        import openai
+        return isinstance(exc, (openai.RateLimitError, openai.APIConnectionError,
+                                openai.APITimeoutError, openai.InternalServerError))
+
+
+class StubBackend:
+    """Offline backend: deterministic answer derived from the prompt"""
+
+    def __init__(self, reply: str = None):
+        self.reply = reply
+        self.calls = 0
+
+    def complete(self, model: str, prompt: str) -> str:
+        self.calls += 1
+        if self.reply is not None:
+            return self.reply
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return f"[stub:{model}] no insights available offline (prompt {digest})"
+
+    async def acomplete(self, model: str, prompt: str) -> str:
+        return self.complete(model, prompt)
+
+    def is_retryable(self, exc: Exception) -> bool:
+        return False
+
+
+def get_backend(name: str = None):
+    name = (name or os.getenv("KTNG_LLM_BACKEND", "openai")).lower()
+    if name == "stub":
+        return StubBackend()
+    if name == "openai":
+        return OpenAIBackend()
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+class InsightClient:
+    """Cached LLM client with a bounded-concurrency async path for many prompts"""
+
+    def __init__(self, backend=None, model: str = None, cache: ResponseCache = None,
+                 use_cache: bool = True, concurrency: int = 4, retries: int = 3, backoff: float = 1.0):
+        self.backend = backend or get_backend()
+        self.model = model or os.getenv("KTNG_LLM_MODEL", DEFAULT_MODEL)
+        self.cache = (cache or ResponseCache()) if use_cache else None
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+
+    def _cached(self, prompt: str):
+        return self.cache.get(self.model, prompt) if self.cache is not None else None
+
+    def _store(self, prompt: str, content: str):
+        if self.cache is not None and content is not None:
+            self.cache.put(self.model, prompt, content)
+
+    def _delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    def ask(self, prompt: str) -> str:
+        content = self._cached(prompt)
+        if content is not None:
+            return content
+        for attempt in range(self.retries + 1):
+            try:
+                content = self.backend.complete(self.model, prompt)
+                break
+            except Exception as e:
+                if attempt == self.retries or not self.backend.is_retryable(e):
+                    raise
+                time.sleep(self._delay(attempt))
+        self._store(prompt, content)
+        return content
+
+    async def aask(self, prompt: str, semaphore: asyncio.Semaphore) -> str:
+        content = self._cached(prompt)
+        if content is not None:
+            return content
+        for attempt in range(self.retries + 1):
+            try:
+                async with semaphore:
+                    content = await self.backend.acomplete(self.model, prompt)
+                break
+            except Exception as e:
+                if attempt == self.retries or not self.backend.is_retryable(e):
+                    raise
+                await asyncio.sleep(self._delay(attempt))
+        self._store(prompt, content)
+        return content
+
+    async def aask_many(self, prompts: dict) -> dict:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # identical summaries (e.g. repeated sheets) are sent once
+        unique = list(dict.fromkeys(prompts.values()))
+        results = await asyncio.gather(*(self.aask(p, semaphore) for p in unique),
+                                       return_exceptions=True)
+        by_prompt = dict(zip(unique, results))
+        return {label: by_prompt[p] for label, p in prompts.items()}
+
+    def ask_many(self, prompts: dict) -> dict:
+        """{label: prompt} -> {label: answer or exception}; failures don't cancel the rest"""
+        return asyncio.run(self.aask_many(prompts))
@@ -1,16 +1,172 @@
+import time
+
+_T0 = time.perf_counter()
+
 import os
-from analyzer import ExcelAnalyzer
+import sys
+import argparse
 
-if __name__ == "__main__":
-    # Ask user for Excel file
-    file_path = input("📂 Please enter the path to your Excel file: ").strip()
+# Heavy modules (pandas, matplotlib, openai) are imported inside the subcommands,
+# so `--help` and argument errors return immediately.
 
-    # Remove quotes if pasted with them
-    file_path = file_path.strip('"').strip("'")
 
+def _check_file(file_path: str) -> str:
+    # Remove quotes if pasted with them
+    file_path = file_path.strip().strip('"').strip("'")
     if not os.path.exists(file_path):
         print(f"❌ File not found: {file_path}")
-        exit(1)
+        sys.exit(1)
+    return file_path
+
+
+def _analyzer(args):
+    from analyzer import ExcelAnalyzer
+    return ExcelAnalyzer(_check_file(args.file), use_cache=not args.no_cache)
+
+
+def _pair(value: str):
+    group_col, sep, value_col = value.partition(":")
+    if not sep or not group_col or not value_col:
+        raise argparse.ArgumentTypeError("expected GROUP:VALUE, e.g. Region:Sales")
+    return group_col, value_col
+
+
+def cmd_load(args):
+    analyzer = _analyzer(args)
+    df = analyzer.load_data(columns=args.columns)
+    print("✅ Data loaded:")
+    print(df.head(args.rows))
+
+
+def cmd_describe(args):
+    analyzer = _analyzer(args)
+    t_ready = time.perf_counter()
+    if args.streaming:
+        stats = analyzer.streaming_analysis(workers=args.workers, columns=args.columns)
+    else:
+        analyzer.load_data(columns=args.columns)
+        stats = analyzer.basic_analysis()
+    t_done = time.perf_counter()
+    print("📊 Basic analysis:")
+    print(stats)
+    print(f"⏱ startup {(t_ready - _T0) * 1000:.0f} ms, describe {(t_done - t_ready) * 1000:.0f} ms",
+          file=sys.stderr)
+
+
+def cmd_insights(args):
+    if args.backend:
+        os.environ["KTNG_LLM_BACKEND"] = args.backend
+    analyzer = _analyzer(args)
+    if args.all_sheets:
+        import pandas as pd
+        frames = pd.read_excel(analyzer.file_path, sheet_name=None)
+        for sheet, answer in analyzer.ask_chatgpt_many(frames).items():
+            print(f"\n🤖 GPT Insights — {sheet}:")
+            print(f"⚠️ {answer}" if isinstance(answer, Exception) else answer)
+    else:
+        df = analyzer.load_data(columns=args.columns)
+        print("🤖 GPT Insights:")
+        print(analyzer.ask_chatgpt(df))
+
+
+def cmd_plot(args):
+    analyzer = _analyzer(args)
+    analyzer.load_data(columns=args.columns)
+    paths = analyzer.make_dashboards(args.pair, out_dir=args.out_dir, workers=args.workers, force=args.force)
+    for (group_col, value_col), path in paths.items():
+        print(f"📈 {value_col} by {group_col}: {path}")
+
+
+def _analyze_one(file_path: str, pairs, chart_dir: str, use_cache: bool):
+    """Batch worker: load, describe and chart one workbook; returns a small picklable summary"""
+    from analyzer import ExcelAnalyzer
+
+    started = time.perf_counter()
+    result = {"file": file_path, "rows": None, "cols": None, "charts": {}, "stats": None, "error": None}
+    try:
+        analyzer = ExcelAnalyzer(file_path, use_cache=use_cache)
+        df = analyzer.load_data()
+        result["rows"], result["cols"] = int(df.shape[0]), int(df.shape[1])
+        result["stats"] = analyzer.basic_analysis()
+        usable = [(g, v) for g, v in pairs if g in df.columns and v in df.columns]
+        if usable:
+            stem = os.path.splitext(os.path.basename(file_path))[0]
+            paths = analyzer.make_dashboards(usable, out_dir=os.path.join(chart_dir, stem), workers=1)
+            result["charts"] = {f"{v} by {g}": p for (g, v), p in paths.items()}
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _batch_files(source: str, pattern: str):
+    import glob
+    if os.path.isdir(source):
+        files = glob.glob(os.path.join(source, pattern))
+    else:
+        files = glob.glob(source)
+    # skip Excel lock files of workbooks open in Excel
+    return sorted(f for f in files if os.path.isfile(f) and not os.path.basename(f).startswith("~$"))
+
+
+def cmd_batch(args):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    files = _batch_files(args.source, args.pattern)
+    if not files:
+        print(f"❌ No Excel files found: {args.source}")
+        sys.exit(1)
+    os.makedirs(args.out_dir, exist_ok=True)
+    chart_dir = os.path.join(args.out_dir, "charts")
+    pairs = args.pair or []
+
+    # each worker holds one workbook at a time, so memory is bounded by --workers
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(_analyze_one, f, pairs, chart_dir, not args.no_cache) for f in files]
+        for fut in as_completed(futures):
+            res = fut.result()
+            status = f"❌ {res['error']}" if res["error"] else f"✅ {res['rows']}×{res['cols']}"
+            print(f"{status}  {res['file']} ({res['seconds']}s)")
+            results.append(res)
+    results.sort(key=lambda r: r["file"])
+
+    import json
+    import pandas as pd
+
+    index = [{k: r[k] for k in ("file", "rows", "cols", "charts", "error", "seconds")} for r in results]
+    stats_frames = []
+    for r in results:
+        if r["stats"] is None:
+            continue
+        long = r["stats"].stack().rename("value").reset_index()
+        long.columns = ["stat", "column", "value"]
+        long = long[long["value"].notna()]
+        long.insert(0, "file", r["file"])
+        stats_frames.append(long[["file", "column", "stat", "value"]])
+
+    report_path = os.path.join(args.out_dir, "report.xlsx")
+    with pd.ExcelWriter(report_path, engine="openpyxl") as writer:
+        index_df = pd.DataFrame(index)
+        index_df["charts"] = index_df["charts"].map(lambda c: "\n".join(c.values()))
+        index_df.to_excel(writer, sheet_name="index", index=False)
+        if stats_frames:
+            stats_long = pd.concat(stats_frames, ignore_index=True)
+            stats_long["value"] = stats_long["value"].astype(str)
+            stats_long.to_excel(writer, sheet_name="stats", index=False)
+    index_path = os.path.join(args.out_dir, "index.json")
+    with open(index_path, "w", encoding="utf-8") as fh:
+        json.dump(index, fh, ensure_ascii=False, indent=1)
+
+    failed = sum(1 for r in results if r["error"])
+    print(f"\n📄 Report: {report_path}\n🗂️ Index: {index_path}  ({len(results) - failed} ok, {failed} failed)")
+
+
+def interactive():
+    from analyzer import ExcelAnalyzer
+
+    # Ask user for Excel file
+    file_path = _check_file(input("📂 Please enter the path to your Excel file: "))
 
     analyzer = ExcelAnalyzer(file_path)
 
@@ -35,3 +191,61 @@ if __name__ == "__main__":
         print(f"\n📈 Chart saved: {chart_path}")
     except Exception as e:
         print(f"⚠️ Could not generate chart: {e}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Excel analyzer (run without arguments for interactive mode)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_file(p):
+        p.add_argument("file", help="Path to the Excel file")
+        p.add_argument("--no-cache", action="store_true", help="Don't use the Parquet sidecar cache")
+        p.add_argument("--columns", nargs="+", help="Load only these columns")
+
+    p = sub.add_parser("load", help="Load the workbook and show the first rows")
+    add_file(p)
+    p.add_argument("--rows", type=int, default=5)
+    p.set_defaults(func=cmd_load)
+
+    p = sub.add_parser("describe", help="Descriptive statistics (reports startup time on stderr)")
+    add_file(p)
+    p.add_argument("--streaming", action="store_true", help="Chunked, parallel approximate statistics")
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(func=cmd_describe)
+
+    p = sub.add_parser("insights", help="LLM insights on the dataset summary")
+    add_file(p)
+    p.add_argument("--all-sheets", action="store_true", help="One insight per sheet, requested concurrently")
+    p.add_argument("--backend", choices=["openai", "stub"], help="Override KTNG_LLM_BACKEND")
+    p.set_defaults(func=cmd_insights)
+
+    p = sub.add_parser("plot", help="Bar charts for GROUP:VALUE column pairs")
+    add_file(p)
+    p.add_argument("--pair", type=_pair, action="append", required=True, help="GROUP:VALUE, repeatable")
+    p.add_argument("--out-dir", default="dashboards")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--force", action="store_true", help="Re-render charts even if data didn't change")
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser("batch", help="Load, describe and chart every workbook in a folder across processes")
+    p.add_argument("source", help="Directory or glob, e.g. 'regions/*.xlsx'")
+    p.add_argument("--pattern", default="*.xlsx", help="File pattern when SOURCE is a directory")
+    p.add_argument("--pair", type=_pair, action="append", help="GROUP:VALUE chart for files having both columns")
+    p.add_argument("--out-dir", default="reports")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    p.add_argument("--no-cache", action="store_true", help="Don't use the Parquet sidecar cache")
+    p.set_defaults(func=cmd_batch)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        interactive()
+        return
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
-import pandas as pd
-from tkinter import Tk, filedialog
+import argparse
+import sys
+
+from user_mobile import DEFAULT_SUFFIX, DEFAULT_NAME_TEMPLATE, fold_file, fold_folder
 
 def main():
+    from tkinter import Tk, filedialog
+
     Tk().withdraw()
     file_path = filedialog.askopenfilename(
         title="Выберите Excel файл",
@@ -11,68 +15,39 @@ def main():
         print("❌ Файл не выбран")
         return
 
-    # Читаем Excel без заголовков
-    df_raw = pd.read_excel(file_path, header=None, dtype=str)
-
-    # Ищем строку с настоящими заголовками (где есть слово "Пользователь" или "User")
-    header_row = None
-    for i, row in df_raw.iterrows():
-        row_values = [str(x) for x in row.tolist()]
-        if any("ользов" in val or "User" in val for val in row_values):
-            header_row = i
-            break
-
-    if header_row is None:
-        print("❌ Не удалось найти строку с заголовками")
-        return
-
-    # Читаем заново с правильными заголовками
-    df = pd.read_excel(file_path, header=header_row, dtype=str)
-    df.columns = df.columns.str.strip()
-
-    print("✅ Заголовки колонок:", df.columns.tolist())
-
-    # Определяем колонку Пользователь
-    user_col = None
-    for col in df.columns:
-        if "ользов" in col or "User" in col:
-            user_col = col
-            break
-
-    if not user_col:
-        print("❌ Колонка Пользователь не найдена!")
+    try:
+        output_file, before, after = fold_file(file_path)
+    except ValueError as e:
+        print(f"❌ {e}")
         return
 
-    # Добавляем Mobile если нет
-    if "Mobile" not in df.columns:
-        df["Mobile"] = ""
-
-    merged_rows = []
-    skip_next = False
-
-    for i in range(len(df)):
-        if skip_next:
-            skip_next = False
-            continue
-
-        row = df.iloc[i].copy()
-
-        # Проверяем следующую строку: если там только цифры → это телефон
-        if i + 1 < len(df):
-            next_val = str(df.iloc[i + 1][user_col]).strip()
-            if next_val.isdigit():
-                row["Mobile"] = next_val
-                skip_next = True
-
-        merged_rows.append(row)
-
-    new_df = pd.DataFrame(merged_rows)
-
-    # Сохраняем
-    output_file = file_path.replace(".xlsx", "_August2.xlsx")
-    new_df.to_excel(output_file, index=False)
-
-    print(f"\n✅ Готово! Файл объединён и сохранён как: {output_file}")
+    print(f"\n✅ Готово! Файл объединён ({before} → {after} строк) и сохранён как: {output_file}")
+
+def batch(argv):
+    parser = argparse.ArgumentParser(description="Перенос строк-телефонов в колонку Mobile для папки выгрузок")
+    parser.add_argument("--input-dir", required=True, help="Папка с ежемесячными выгрузками")
+    parser.add_argument("--pattern", default="*.xlsx", help="Маска файлов (по умолчанию *.xlsx)")
+    parser.add_argument("--output-dir", default=None, help="Куда сохранять (по умолчанию рядом с исходником)")
+    parser.add_argument("--suffix", default=DEFAULT_SUFFIX, help="Суффикс имени результата")
+    parser.add_argument("--name-template", default=DEFAULT_NAME_TEMPLATE,
+                        help="Шаблон имени: {stem}, {suffix}, {ext} (по умолчанию {stem}{suffix}.xlsx)")
+    args = parser.parse_args(argv)
+
+    results = fold_folder(args.input_dir, args.pattern, args.output_dir, args.suffix, args.name_template)
+    if not results:
+        print(f"❌ Нет файлов {args.pattern} в {args.input_dir}")
+        return 1
+    failed = 0
+    for src, out, before, after, error in results:
+        if error:
+            failed += 1
+            print(f"❌ {src}: {error}")
+        else:
+            print(f"✅ {src} → {out} ({before} → {after} строк)")
+    return 1 if failed else 0
 
 if __name__ == "__main__":
+    # без аргументов — как раньше, с выбором файла в диалоге
+    if len(sys.argv) > 1:
+        sys.exit(batch(sys.argv[1:]))
     main()
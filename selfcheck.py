@@ -0,0 +1,136 @@
+"""Equivalence checks for the vectorized rewrites against the original row-by-row code
+
+    python selfcheck.py fold [--trials 500]
+    python selfcheck.py merge [--rows 20000] [--partitions 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import types
+
+import numpy as np
+import pandas as pd
+
+
+def _fold_loop(df: pd.DataFrame, user_col: str, mobile_col: str = "Mobile") -> pd.DataFrame:
+    # the original loop from "new column.py", kept as the reference
+    df = df.copy()
+    if mobile_col not in df.columns:
+        df[mobile_col] = ""
+    merged_rows = []
+    skip_next = False
+    for i in range(len(df)):
+        if skip_next:
+            skip_next = False
+            continue
+        row = df.iloc[i].copy()
+        if i + 1 < len(df):
+            next_val = str(df.iloc[i + 1][user_col]).strip()
+            if next_val.isdigit():
+                row[mobile_col] = next_val
+                skip_next = True
+        merged_rows.append(row)
+    return pd.DataFrame(merged_rows, columns=df.columns)
+
+
+def _random_export(rng) -> pd.DataFrame:
+    n = int(rng.integers(0, 30))
+    pool = np.array(["ann", "bob", " 99890123 ", "998901", "x1", "", None, "12a"], dtype=object)
+    df = pd.DataFrame({"Пользователь": rng.choice(pool, n), "Сумма": rng.integers(0, 100, n).astype(str)})
+    if rng.random() < 0.5:
+        df["Mobile"] = ""
+    return df
+
+
+def check_fold(trials: int, seed: int = 0) -> int:
+    from user_mobile import fold_phone_rows
+
+    rng = np.random.default_rng(seed)
+    for trial in range(trials):
+        df = _random_export(rng)
+        expected = _fold_loop(df, "Пользователь")
+        got = fold_phone_rows(df, "Пользователь")
+        try:
+            pd.testing.assert_frame_equal(got.astype(object), expected.astype(object))
+        except AssertionError as e:
+            print(f"❌ fold: trial {trial} differs\n{df}\n{e}")
+            return 1
+    print(f"✅ fold: {trials} random exports match the original loop")
+    return 0
+
+
+def _random_prepared(rng, rows: int, n: int) -> list:
+    # prepared frames as merge_on_id sees them: unique string ids, overlapping across files
+    frames = []
+    for i in range(n):
+        ids = rng.choice(rows * 2, rows, replace=False)
+        frames.append(pd.DataFrame({
+            "id": pd.Series(ids.astype(str), dtype="str"),
+            f"amount_{i}": rng.normal(size=rows),
+            f"region_{i}": pd.Categorical(rng.choice(["north", "south", "east"], rows)),
+        }))
+    return frames
+
+
+def check_merge(rows: int, partitions: int, seed: int = 0) -> int:
+    from data.join import merge_on_id, merge_on_id_partitioned
+
+    frames = _random_prepared(np.random.default_rng(seed), rows, 3)
+    for how in ("outer", "inner", "left", "right"):
+        expected, expected_cols = merge_on_id(frames, how=how)
+        got, got_cols = merge_on_id_partitioned(frames, how=how, partitions=partitions)
+        try:
+            assert got_cols == expected_cols
+            pd.testing.assert_frame_equal(got, expected)
+        except AssertionError as e:
+            print(f"❌ merge: {how} join differs between serial and {partitions} partitions\n{e}")
+            return 1
+    print(f"✅ merge: outer/inner/left/right match serial merge_on_id ({rows} rows x 3 files, {partitions} partitions)")
+    return check_merge_app_main(partitions)
+
+
+def check_merge_app_main(partitions: int) -> int:
+    # `streamlit run app.py` makes __main__ a plain module whose __file__ is app.py;
+    # forkserver/spawn workers must not re-run that script
+    from concurrent.futures.process import BrokenProcessPool
+
+    from data.join import merge_on_id, merge_on_id_partitioned
+
+    frames = _random_prepared(np.random.default_rng(1), 1_000, 2)
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "app.py")
+        with open(script, "w") as f:
+            f.write("raise SystemExit('worker re-ran the app script')\n")
+        app_main = types.ModuleType("__main__")
+        app_main.__file__ = script
+        real_main = sys.modules["__main__"]
+        sys.modules["__main__"] = app_main
+        try:
+            got, _ = merge_on_id_partitioned(frames, partitions=partitions)
+        except BrokenProcessPool as e:
+            print(f"❌ merge: workers re-ran the Streamlit-style __main__ ({e})")
+            return 1
+        finally:
+            sys.modules["__main__"] = real_main
+    pd.testing.assert_frame_equal(got, merge_on_id(frames)[0])
+    print("✅ merge: workers start without re-running a Streamlit-style __main__")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check vectorized rewrites against the original code")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("fold", help="user_mobile.fold_phone_rows vs the original loop")
+    p.add_argument("--trials", type=int, default=500)
+    p.set_defaults(func=lambda a: check_fold(a.trials))
+    p = sub.add_parser("merge", help="data.join.merge_on_id_partitioned vs the serial merge_on_id")
+    p.add_argument("--rows", type=int, default=20_000)
+    p.add_argument("--partitions", type=int, default=4)
+    p.set_defaults(func=lambda a: check_merge(a.rows, a.partitions))
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""Streaming, mergeable column statistics.
+
+Chunks of rows are summarized independently (in worker processes) and the
+partial summaries are merged, so a workbook never has to be in memory at once.
+Numeric columns keep count/mean/variance (Chan's parallel formula) plus a
+t-digest-style quantile sketch; text columns keep Misra-Gries heavy hitters
+and a KMV distinct-count sketch. Every chunk is typed on its own, and a column
+whose chunks disagree (numbers first, text further down) is summarized as text,
+the way pd.read_excel reads it whole.
+"""
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+NUMERIC, DATETIME, OBJECT = "numeric", "datetime", "object"
+
+
+class TDigest:
+    """Merging t-digest: centroids are combined along the k1 (arcsine) scale"""
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values: np.ndarray):
+        self._absorb(values.astype(float), np.ones(len(values)))
+
+    def merge(self, other: "TDigest"):
+        self._absorb(other.means, other.weights)
+
+    def _absorb(self, means: np.ndarray, weights: np.ndarray):
+        m = np.concatenate([self.means, means])
+        w = np.concatenate([self.weights, weights])
+        if not len(m):
+            return
+        order = np.argsort(m, kind="mergesort")
+        m, w = m[order], w[order]
+        total = w.sum()
+        q_mid = (np.cumsum(w) - w / 2) / total
+        # points falling into the same unit of k(q) collapse into one centroid
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q_mid - 1)).astype(np.int64)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(k)) + 1])
+        cw = np.add.reduceat(w, starts)
+        self.means = np.add.reduceat(w * m, starts) / cw
+        self.weights = cw
+
+    def quantile(self, q: float, vmin: float, vmax: float) -> float:
+        if not len(self.means):
+            return np.nan
+        total = self.weights.sum()
+        mids = np.cumsum(self.weights) - self.weights / 2
+        xp = np.concatenate([[0.0], mids, [total]])
+        fp = np.concatenate([[vmin], self.means, [vmax]])
+        return float(np.interp(q * total, xp, fp))
+
+
+class HeavyHitters:
+    """Misra-Gries summary; counts are lower bounds, exact while distinct values <= capacity"""
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype="float64")
+
+    def update(self, values: pd.Series):
+        self._absorb(values.value_counts(dropna=True).astype("float64"))
+
+    def merge(self, other: "HeavyHitters"):
+        self._absorb(other.counts)
+
+    def _absorb(self, counts: pd.Series):
+        if len(self.counts):
+            # no index union: mixed columns (ints next to dates or text) cannot be sorted
+            merged = pd.concat([self.counts, counts]).groupby(level=0, sort=False).sum()
+        else:
+            merged = counts
+        if len(merged) > self.capacity:
+            kth = merged.nlargest(self.capacity + 1).iloc[-1]
+            merged = merged[merged > kth] - kth
+        self.counts = merged
+
+    def top(self):
+        if not len(self.counts):
+            return np.nan, np.nan
+        value = self.counts.idxmax()
+        return value, int(self.counts[value])
+
+
+class DistinctSketch:
+    """K-minimum-values distinct counter over 64-bit value hashes; exact below k distinct"""
+
+    def __init__(self, k: int = 4096):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def update(self, values: pd.Series):
+        self._absorb(value_hashes(values))
+
+    def merge(self, other: "DistinctSketch"):
+        self._absorb(other.hashes)
+
+    def _absorb(self, hashes: np.ndarray):
+        if len(self.hashes) >= self.k:
+            hashes = hashes[hashes < self.hashes[-1]]  # cannot enter the k smallest
+        if len(hashes) > 2 * self.k:
+            # if the 2k smallest hold k distinct values, the k smallest distinct are among them
+            head = np.unique(np.partition(hashes, 2 * self.k)[: 2 * self.k])
+            if len(head) >= self.k:
+                hashes = head
+        self.hashes = np.unique(np.concatenate([self.hashes, hashes]))[: self.k]
+
+    def estimate(self) -> int:
+        if len(self.hashes) < self.k:
+            return int(len(self.hashes))
+        return int(round((self.k - 1) / (float(self.hashes[-1]) / 2.0 ** 64)))
+
+
+_DATETIME_SALT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def value_hashes(values: pd.Series) -> np.ndarray:
+    """64-bit hashes that agree whatever dtype a chunk was read with.
+
+    Numbers hash as float64 and datetimes as int64 nanoseconds (salted apart), also
+    inside object columns, so 7 from an int chunk and 7 from a mixed chunk count once,
+    as in value_counts. Anything else hashes as text.
+    """
+    kind = column_kind(values)
+    if kind == NUMERIC:
+        return pd.util.hash_array(values.to_numpy(dtype="float64") + 0.0)  # -0.0 == 0.0
+    if kind == DATETIME:
+        ns = pd.to_datetime(values).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        return pd.util.hash_array(ns) ^ _DATETIME_SALT
+    v = values.to_numpy(dtype=object)
+    if pd.api.types.infer_dtype(v, skipna=False) == "string":
+        return pd.util.hash_array(v)
+    is_num = np.fromiter((isinstance(x, (int, float, np.number)) and not isinstance(x, (bool, np.bool_))
+                          for x in v), dtype=bool, count=len(v))
+    is_dt = np.fromiter((isinstance(x, (datetime.datetime, np.datetime64)) for x in v), dtype=bool, count=len(v))
+    is_text = ~(is_num | is_dt)
+    out = np.empty(len(v), dtype=np.uint64)
+    if is_num.any():
+        out[is_num] = value_hashes(pd.Series(v[is_num].astype("float64")))
+    if is_dt.any():
+        out[is_dt] = value_hashes(pd.Series(pd.to_datetime(v[is_dt])))
+    if is_text.any():
+        out[is_text] = pd.util.hash_array(v[is_text].astype(str).astype(object))
+    return out
+
+
+class ColumnStats:
+    """Mergeable accumulator for one column.
+
+    The kind is unknown (None) until a chunk with values arrives. Text sketches are
+    kept for every kind, so when a later chunk disagrees the column falls back to
+    OBJECT without losing the rows already seen.
+    """
+
+    def __init__(self, kind: str = None):
+        self.kind = kind
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.digest = TDigest()
+        self.hitters = HeavyHitters()
+        self.distinct = DistinctSketch()
+
+    def update(self, s: pd.Series):
+        values = s.dropna()
+        if not len(values):
+            return
+        part = ColumnStats(column_kind(s))
+        part.count = len(values)
+        part.hitters.update(values)
+        part.distinct.update(values)
+        if part.kind != OBJECT:
+            if part.kind == DATETIME:
+                x = pd.to_datetime(values).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+            else:
+                x = values.to_numpy(dtype=float)
+            part.mean = float(x.mean())
+            part.m2 = float(((x - part.mean) ** 2).sum())
+            part.min, part.max = float(x.min()), float(x.max())
+            part.digest.update(x)
+        self.merge(part)
+
+    def merge(self, other: "ColumnStats"):
+        if not other.count:
+            return
+        if not self.count:
+            self.__dict__.update(other.__dict__)
+            return
+        if other.kind != self.kind:
+            # chunks disagree: read whole, the column would be object dtype
+            self.kind = OBJECT
+        n = self.count + other.count
+        self.hitters.merge(other.hitters)
+        self.distinct.merge(other.distinct)
+        if self.kind != OBJECT:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / n
+            self.m2 += other.m2 + delta * delta * self.count * other.count / n
+            self.min = np.nanmin([self.min, other.min])
+            self.max = np.nanmax([self.max, other.max])
+            self.digest.merge(other.digest)
+        self.count = n
+
+    def describe(self) -> dict:
+        if self.kind == OBJECT:
+            top, freq = self.hitters.top()
+            return {"count": self.count, "unique": self.distinct.estimate(), "top": top, "freq": freq}
+        # a column without any value reads as all-NaN float64
+        out = {"count": self.count, "mean": self.mean if self.count else np.nan}
+        if self.kind in (NUMERIC, None):
+            out["std"] = float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+        out["min"] = self.min
+        for q, label in ((0.25, "25%"), (0.5, "50%"), (0.75, "75%")):
+            out[label] = self.digest.quantile(q, self.min, self.max)
+        out["max"] = self.max
+        if self.kind == DATETIME:
+            for key in ("mean", "min", "25%", "50%", "75%", "max"):
+                out[key] = pd.NaT if pd.isna(out[key]) else pd.Timestamp(int(out[key]))
+        return out
+
+
+def column_kind(s: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(s):
+        return OBJECT
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return DATETIME
+    if pd.api.types.is_numeric_dtype(s):
+        return NUMERIC
+    return OBJECT
+
+
+def summarize_chunk(df: pd.DataFrame) -> dict:
+    """Summarize one chunk into {column: ColumnStats} (runs in worker processes)"""
+    stats = {}
+    for col in df.columns:
+        acc = ColumnStats()
+        acc.update(df[col])
+        stats[col] = acc
+    return stats
+
+
+def merge_summaries(total: dict, part: dict) -> dict:
+    for col, acc in part.items():
+        if col in total:
+            total[col].merge(acc)
+        else:
+            total[col] = acc
+    return total
+
+
+def dedup_names(header):
+    """Column names as pd.read_excel builds them: empty -> "Unnamed: i", repeats -> A.1, A.2, ...
+
+    Follows pandas' python parser, including its order: named columns are renamed
+    before unnamed ones, and a suffix already taken by another header is skipped.
+    """
+    names = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+    unnamed = [i for i, h in enumerate(header) if h is None]
+    counts = {}
+    for i in [i for i in range(len(names)) if i not in unnamed] + unnamed:
+        col = old_col = names[i]
+        count = counts.get(col, 0)
+        while count > 0:
+            counts[old_col] = count + 1
+            col = f"{old_col}.{count}"
+            count = count + 1 if col in names else counts.get(col, 0)
+        names[i] = col
+        counts[col] = count + 1
+    return names
+
+
+def iter_excel_chunks(file_path: str, chunksize: int = 50_000, columns=None):
+    """Stream an xlsx sheet as DataFrames of `chunksize` rows (openpyxl read-only mode)"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        # first sheet, like pd.read_excel and the sidecar cache (not the active one)
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = dedup_names(header)
+        buf = []
+        for row in rows:
+            buf.append(row)
+            if len(buf) >= chunksize:
+                yield _chunk_frame(buf, header, columns)
+                buf = []
+        if buf:
+            yield _chunk_frame(buf, header, columns)
+    finally:
+        wb.close()
+
+
+def _chunk_frame(rows, header, columns):
+    width = len(header)
+    rows = [tuple(r[:width]) + (None,) * (width - len(r)) for r in rows]
+    df = pd.DataFrame.from_records(rows, columns=header)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df.infer_objects()
+
+
+def iter_parquet_chunks(parquet_path: str, chunksize: int = 50_000, columns=None):
+    """Stream a Parquet file (e.g. the analyzer's sidecar cache) batch by batch"""
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(parquet_path, memory_map=True)
+    for batch in pf.iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+def describe_streaming(chunks, workers: int = None, max_pending: int = None) -> pd.DataFrame:
+    """describe(include="all")-shaped summary of an iterable of DataFrame chunks.
+
+    Chunks are summarized in a process pool; at most `max_pending` chunks are in
+    flight, so memory stays bounded by the worker count rather than the file size.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    total, order = {}, []
+
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return pd.DataFrame()
+    order = list(first.columns)
+
+    if workers == 1:
+        merge_summaries(total, summarize_chunk(first))
+        for chunk in chunks:
+            merge_summaries(total, summarize_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {pool.submit(summarize_chunk, first)}
+            for chunk in chunks:
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        merge_summaries(total, fut.result())
+                pending.add(pool.submit(summarize_chunk, chunk))
+            for fut in pending:
+                merge_summaries(total, fut.result())
+
+    rows = ["count", "unique", "top", "freq", "mean", "std", "min", "25%", "50%", "75%", "max"]
+    described = pd.DataFrame({col: pd.Series(total[col].describe()) for col in order})
+    return described.reindex([r for r in rows if r in described.index])
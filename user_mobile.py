@@ -0,0 +1,138 @@
+"""Складывание строк-телефонов в колонку Mobile для выгрузок пользователей.
+
+В выгрузке под строкой пользователя иногда идёт строка, где в колонке
+"Пользователь" только цифры — это его телефон. Такие строки переносятся
+в колонку Mobile предыдущей строки и удаляются.
+"""
+import glob
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data import read_excel, write_xlsx
+
+HEADER_MARKERS = ("ользов", "User")
+HEADER_SCAN_ROWS = 50
+DEFAULT_SUFFIX = "_merged"
+DEFAULT_NAME_TEMPLATE = "{stem}{suffix}.xlsx"
+
+
+def find_header_row(file_path, max_rows=HEADER_SCAN_ROWS):
+    """Номер строки с заголовками (где есть "Пользователь"/"User") среди первых max_rows строк.
+
+    Для .xlsx читает только начало листа в режиме openpyxl read-only, не разбирая весь файл.
+    """
+    if str(file_path).lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            # первый лист, как и у read_excel ниже, а не активный
+            rows = wb.worksheets[0].iter_rows(max_row=max_rows, values_only=True)
+            for i, row in enumerate(rows):
+                if any(v is not None and any(m in str(v) for m in HEADER_MARKERS) for v in row):
+                    return i
+        finally:
+            wb.close()
+        return None
+
+    # .xls и прочее: openpyxl не умеет, берём только первые строки через pandas
+    df_head = pd.read_excel(file_path, header=None, dtype=str, nrows=max_rows)
+    for i, row in enumerate(df_head.itertuples(index=False)):
+        if any(any(m in str(x) for m in HEADER_MARKERS) for x in row):
+            return i
+    return None
+
+
+def find_user_column(columns):
+    for col in columns:
+        if any(m in str(col) for m in HEADER_MARKERS):
+            return col
+    return None
+
+
+def fold_phone_rows(df: pd.DataFrame, user_col: str, mobile_col: str = "Mobile") -> pd.DataFrame:
+    """Переносит строки, где в user_col только цифры, в mobile_col предыдущей строки.
+
+    Повторяет построчный алгоритм (слева направо, поглощённая строка сама ничего не
+    поглощает), но за один векторный проход: в серии подряд идущих строк-телефонов
+    поглощается каждая вторая, начиная с первой (или со второй, если серия
+    начинается с первой строки файла).
+    """
+    out = df.copy()
+    if mobile_col not in out.columns:
+        out[mobile_col] = ""
+    if out.empty:
+        return out
+
+    vals = out[user_col].fillna("").astype(str).str.strip()
+    is_phone = vals.str.isdigit().to_numpy(dtype=bool)
+
+    pos = np.arange(len(out))
+    # позиция последней строки-не-телефона слева (включительно), -1 если её нет
+    last_other = np.maximum.accumulate(np.where(is_phone, -1, pos))
+    run_offset = pos - last_other - 1
+    consumed = is_phone & np.where(last_other >= 0, run_offset % 2 == 0, run_offset % 2 == 1)
+
+    owners = np.flatnonzero(consumed) - 1
+    mobile_idx = out.columns.get_loc(mobile_col)
+    out.iloc[owners, mobile_idx] = vals.to_numpy()[consumed]
+    return out[~consumed]
+
+
+def fold_file(file_path, output_file=None, suffix=DEFAULT_SUFFIX, name_template=DEFAULT_NAME_TEMPLATE,
+              output_dir=None):
+    """Читает выгрузку, складывает телефоны и сохраняет результат. Возвращает (путь, строк до, строк после)."""
+    header_row = find_header_row(file_path)
+    if header_row is None:
+        raise ValueError(f"Не удалось найти строку с заголовками (первые {HEADER_SCAN_ROWS} строк)")
+
+    # Читаем файл один раз, сразу с правильными заголовками; выгрузка читается однократно — без кэша
+    df = read_excel(file_path, header=header_row, dtype=str, strip=True, use_cache=False)
+
+    user_col = find_user_column(df.columns)
+    if not user_col:
+        raise ValueError("Колонка Пользователь не найдена!")
+
+    new_df = fold_phone_rows(df, user_col)
+
+    if output_file is None:
+        output_file = output_path_for(file_path, suffix, name_template, output_dir)
+    write_xlsx(new_df, output_file)
+    return str(output_file), len(df), len(new_df)
+
+
+def output_path_for(file_path, suffix=DEFAULT_SUFFIX, name_template=DEFAULT_NAME_TEMPLATE, output_dir=None):
+    """Имя результата по шаблону: {stem} — имя исходника без расширения, {suffix}, {ext}."""
+    src = Path(file_path)
+    name = name_template.format(stem=src.stem, suffix=suffix, ext=src.suffix)
+    return Path(output_dir or src.parent) / name
+
+
+def _norm(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def fold_folder(input_dir, pattern="*.xlsx", output_dir=None, suffix=DEFAULT_SUFFIX,
+                name_template=DEFAULT_NAME_TEMPLATE):
+    """Обрабатывает все выгрузки в папке; ошибки по отдельным файлам не останавливают остальные.
+
+    Возвращает список (исходник, результат или None, строк до, строк после, ошибка или None).
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    files = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    # пути сравниваются нормализованными: glob сохраняет "./ex/...", а Path его отбрасывает
+    outputs = {_norm(output_path_for(f, suffix, name_template, output_dir)) for f in files}
+    results = []
+    for f in files:
+        # пропускаем файлы Excel-блокировки и собственные результаты прошлых запусков
+        if os.path.basename(f).startswith("~$") or _norm(f) in outputs:
+            continue
+        try:
+            out, before, after = fold_file(f, suffix=suffix, name_template=name_template, output_dir=output_dir)
+            results.append((f, out, before, after, None))
+        except Exception as e:
+            results.append((f, None, None, None, str(e)))
+    return results